@@ -1,56 +1,457 @@
 import math
-import random
-from move import Move
-from square import Square
+import time
+from position import WHITE, PIECE_VALUES, PAWN, EN_PASSANT_FLAG, move_flag, move_promotion, move_name
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from movepick import MovePicker
+from stats import SearchStats, instrument
+
+MAX_DEPTH = 64
+MAX_PLY = 128
+# Moves assumed left in the game when allocating time from a clock
+DEFAULT_MOVES_TO_GO = 30
+# Captures that cannot bring the score within this margin of alpha (or beta) are skipped in quiescence
+DELTA_MARGIN = 200
+# Score of checkmating and of a tablebase win, less the plies to mate (counted from the root) so that shorter
+# mates are preferred. Scores past DECISIVE_SCORE are mates, kept in the transposition table as plies to
+# mate from the node they were stored at.
+MATE = 30000
+TB_WIN = 20000
+DECISIVE_SCORE = TB_WIN - 1000
+# Limits are only checked every this many nodes (a power of two minus one, used as a mask)
+CHECK_INTERVAL = 1023
+# Null move pruning: from this depth on, a null move searched this much shallower that still fails high cuts
+NULL_MOVE_DEPTH = 3
+NULL_MOVE_REDUCTION = 2
+# Late move reductions: quiet moves from this index in the move order are searched a ply shallower, and
+# two plies from LMR_LATE_MOVES, at depths from LMR_DEPTH
+LMR_DEPTH = 3
+LMR_MOVES = 3
+LMR_LATE_MOVES = 8
+# Futility pruning skips quiet moves when the static evaluation plus this margin per ply of depth is below
+# alpha; reverse futility pruning cuts when it is above beta by REVERSE_FUTILITY_MARGIN per ply
+FUTILITY_DEPTH = 2
+FUTILITY_MARGIN = 150
+REVERSE_FUTILITY_DEPTH = 3
+REVERSE_FUTILITY_MARGIN = 120
+# Aspiration windows: from this depth the root is searched within ASPIRATION_WINDOW of the previous score,
+# the window doubling on every fail until it passes ASPIRATION_LIMIT and opens fully
+ASPIRATION_DEPTH = 4
+ASPIRATION_WINDOW = 50
+ASPIRATION_LIMIT = 1000
+
+
+class SearchStopped(Exception):
+    pass
+
 
 class ChessAI:
-    def __init__(self, color):
+    def __init__(self, color, tt_size_mb=16):
         self.color = color
-        self.start_depth = 2
+        self.start_depth = 4
+        self.tt = TranspositionTable(tt_size_mb)
+        self.stopped = False
+        self.nodes = 0
+        self.node_limit = None
+        self.soft_deadline = None
+        self.hard_deadline = None
+        self.completed_depth = 0
+        # white relative score and principal variation of the last completed iteration
+        self.score = 0
+        self.pv = []
+        # triangular PV table: row `ply` holds the best line found from that ply, pv_length[ply] long
+        self.pv_table = [[None] * (MAX_PLY + 1) for ply in range(MAX_PLY + 1)]
+        self.pv_length = [0] * (MAX_PLY + 1)
+        # whether the node being searched lies on the previous iteration's PV, whose move is then tried first
+        self.following_pv = False
+        # a ponder search runs without time limits until ponderhit() applies the ones it was given
+        self.pondering = False
+        self.search_start = None
+        self._time_limits = None
+        # called as on_iteration(depth, score, move, nodes, seconds) after every completed iteration
+        self.on_iteration = None
+        self.ordering = True
+        self.quiescence = True
+        # selective search, each switched separately to measure what it gains
+        self.null_move = True
+        self.late_move_reductions = True
+        self.futility = True
+        self.reverse_futility = True
+        # recompute the evaluation terms at every leaf and fail loudly on a mismatch (slow)
+        self.debug_eval = False
+        self.root_ply = 0
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        # history[piece code][to square], black codes wrap to the end like the Zobrist piece keys
+        self.history = [[0] * 64 for code in range(13)]
+        # OpeningBook consulted before searching, see book_move
+        self.book = None
+        # Tablebases probed below the root for an exact result
+        self.tablebases = None
+        # SearchStats of the last search, also appended to search_log (a SearchLog) when set
+        self.stats = SearchStats()
+        self.search_log = None
+        # instrumentation hooks: per section timing, cProfile and tracemalloc (all slow the search down)
+        self.timing = False
+        self.profile = False
+        self.trace_memory = False
 
-    def evaluate(self, board, maximizing_color):
-        if maximizing_color == 'white':
-            return board.white_score - board.black_score
-        else:
-            return board.black_score - board.white_score
+    def evaluate(self, position):
+        """ Static evaluation in centipawns for the side to move """
+        if self.debug_eval:
+            self._verify_eval(position)
+        return position.evaluate() * position.side
+
+    @staticmethod
+    def _verify_eval(position):
+        """ Compares the incrementally kept evaluation terms with a recomputation from the mailbox """
+        score, phase = position.compute_score()
+        if (score, phase) != (position.score, position.phase):
+            raise AssertionError(f"incremental evaluation {position.score}/{position.phase} differs from "
+                                 f"recomputed {score}/{phase} after {position.ply} moves")
+
+    def negamax(self, position, depth, alpha, beta, null_allowed=True):
+        """
+        Principal variation search, scoring the position for the side to move. The first move is searched with
+        the (alpha, beta) window and the others with a zero window at alpha, searched again in full only when
+        they beat it. Open window nodes are PV nodes: they take no transposition table cutoffs or pruning, and
+        record their best line in the PV table.
+        """
+        self.nodes += 1
+        if self.nodes & CHECK_INTERVAL == 0:
+            self._check_limits()
+        ply = position.ply - self.root_ply
+        self.pv_length[ply] = ply
+        # a repeated position is scored as a draw the first time it comes back, and so is the fifty-move rule
+        # (without looking for a mate on the last move)
+        if ply and (position.halfmove >= 100 or position.is_repetition()):
+            self.stats.draws += 1
+            return 0
+        if self.tablebases is not None and ply:
+            result = self.tablebases.probe(position)
+            if result is not None:
+                wdl, plies = result
+                return wdl * (TB_WIN - ply - plies)
+        if depth <= 0:
+            return self.quiesce(position, alpha, beta) if self.quiescence else self.evaluate(position)
+
+        pv_node = beta - alpha > 1
+        entry = self.tt.probe(position.hash)
+        hash_move = None
+        if entry:
+            tt_depth, bound, score, hash_move = entry
+            score = self._from_tt(score, ply)
+            if tt_depth >= depth and not pv_node and (bound == EXACT or (bound == LOWER and score >= beta)
+                                                      or (bound == UPPER and score <= alpha)):
+                return score
+        pv_move = self.pv[ply] if self.following_pv and ply < len(self.pv) else None
+        if pv_move is not None:
+            hash_move = pv_move
 
-    def minimax(self, board, depth, alpha, beta, maximizing_player):
-        if depth == 0 or board.game_over():
-            color_eval = "white" if maximizing_player else "black"
-            return None, self.evaluate(board, color_eval)
+        stats = self.stats
+        in_check = position.in_check()
+        # the static evaluation decides the pruning, which is never done at the root or in check
+        static = None
+        if ply and not in_check and (self.null_move or self.futility or self.reverse_futility):
+            static = self.evaluate(position)
+            if (self.reverse_futility and not pv_node and depth <= REVERSE_FUTILITY_DEPTH
+                    and static - REVERSE_FUTILITY_MARGIN * depth >= beta):
+                stats.reverse_futility_cutoffs += 1
+                return static
+            if (self.null_move and null_allowed and not pv_node and depth >= NULL_MOVE_DEPTH and static >= beta
+                    and position.has_non_pawn_material(position.side)):
+                self.following_pv = False
+                position.make_null()
+                score = -self.negamax(position, depth - 1 - NULL_MOVE_REDUCTION, -beta, 1 - beta, False)
+                position.unmake()
+                if score >= beta:
+                    stats.null_cutoffs += 1
+                    return beta
+        futile = self.futility and static is not None and depth <= FUTILITY_DEPTH and \
+            static + FUTILITY_MARGIN * depth <= alpha
+        reducible = self.late_move_reductions and depth >= LMR_DEPTH and not in_check
 
-        moves = board.get_moves(self.color)
-        if moves is None:
-            color_eval = "white" if maximizing_player else "black"
-            return None, self.evaluate(board, color_eval)
+        killers = self.killers[ply]
+        if self.ordering:
+            moves = MovePicker(position, hash_move, killers, self.history)
+        else:
+            moves = position.legal_moves()
+        alpha_orig = alpha
         best_move = None
+        best = -math.inf
+        stats.interior += 1
+
+        for count, move in enumerate(moves):
+            quiet = not move_promotion(move) and not position.is_capture(move)
+            position.make(move)
+            reduction = 0
+            # quiet moves that do not give check, other than the first, may be pruned or reduced
+            if quiet and count and (futile or reducible) and not position.in_check():
+                if futile:
+                    position.unmake()
+                    stats.futility_pruned += 1
+                    continue
+                if count >= LMR_MOVES and move not in killers:
+                    reduction = 1 if count < LMR_LATE_MOVES else 2
+                    stats.reductions += 1
+            self.following_pv = move == pv_move
+            if not count:
+                score = -self.negamax(position, depth - 1, -beta, -alpha)
+            else:
+                score = -self.negamax(position, depth - 1 - reduction, -alpha - 1, -alpha)
+                if reduction and score > alpha:
+                    # the reduced search says the move may be good after all, so it gets the full depth
+                    stats.re_searches += 1
+                    score = -self.negamax(position, depth - 1, -alpha - 1, -alpha)
+                if alpha < score < beta:
+                    stats.pvs_re_searches += 1
+                    score = -self.negamax(position, depth - 1, -beta, -alpha)
+            position.unmake()
+            if score > best:
+                best = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    self._update_pv(ply, move)
+                    if alpha >= beta:
+                        self._cutoff(position, move, depth, ply, count)
+                        break
+        if best_move is None:
+            return -(MATE - ply) if in_check else 0
+        self._store(position, depth, best, best_move, alpha_orig, beta)
+        return best
+
+    def _update_pv(self, ply, move):
+        """ The line from `ply` becomes `move` followed by the line just found from the next ply """
+        row, child = self.pv_table[ply], self.pv_table[ply + 1]
+        length = self.pv_length[ply + 1]
+        row[ply] = move
+        row[ply + 1:length] = child[ply + 1:length]
+        self.pv_length[ply] = max(length, ply + 1)
+
+    def quiesce(self, position, alpha, beta):
+        """ Searches captures only until the position is quiet, so leaves are not scored mid-exchange """
+        self.nodes += 1
+        if self.nodes & CHECK_INTERVAL == 0:
+            self._check_limits()
+        stats = self.stats
+        stats.qnodes += 1
+        if position.ply - self.root_ply > stats.seldepth:
+            stats.seldepth = position.ply - self.root_ply
+        stand_pat = self.evaluate(position)
+        if stand_pat >= beta:
+            return stand_pat
+        alpha = max(alpha, stand_pat)
+
+        best = stand_pat
+        for move in MovePicker(position, quiets=False):
+            # delta pruning: even winning the victim outright would not reach alpha
+            if stand_pat + self._capture_value(position, move) + DELTA_MARGIN <= alpha:
+                continue
+            # losing exchanges are dropped before they are made
+            if position.see(move) < 0:
+                continue
+            position.make(move)
+            score = -self.quiesce(position, -beta, -alpha)
+            position.unmake()
+            if score > best:
+                best = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+        return best
+
+    @staticmethod
+    def _capture_value(position, move):
+        to = (move >> 6) & 63
+        victim = abs(position.squares[to]) or (PAWN if move_flag(move) == EN_PASSANT_FLAG else 0)
+        promotion = move_promotion(move)
+        return PIECE_VALUES[victim] + (PIECE_VALUES[promotion] - PIECE_VALUES[PAWN] if promotion else 0)
+
+    def _cutoff(self, position, move, depth, ply, count):
+        """ Bookkeeping for a beta cutoff by the `count`th move searched """
+        self.stats.cutoffs += 1
+        if not count:
+            self.stats.first_move_cutoffs += 1
+        self._update_quiet_stats(position, move, depth, ply)
 
-        if maximizing_player:
-            max_eval = -math.inf
-            for move in moves:
-                board.move(move.initial.piece, move)
-                current_eval = self.minimax(board, depth - 1, alpha, beta, False)[1]
-                board.undo_move()
-                if current_eval > max_eval:
-                    max_eval = current_eval
-                    best_move = move
-                alpha = max(alpha, current_eval)
-                if beta <= alpha:
-                    break
-            return best_move, max_eval
+    def _update_quiet_stats(self, position, move, depth, ply):
+        """ Remembers a quiet move that caused a cutoff as a killer for this ply and in the history table """
+        if move_promotion(move) or position.is_capture(move):
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[position.squares[move & 63]][(move >> 6) & 63] += depth * depth
+
+    def _store(self, position, depth, score, best_move, alpha, beta):
+        if score <= alpha:
+            bound = UPPER
+        elif score >= beta:
+            bound = LOWER
         else:
-            min_eval = math.inf
-            for move in moves:
-                board.move(move.initial.piece, move)
-                current_eval = self.minimax(board, depth - 1, alpha, beta, True)[1]
-                board.undo_move()
-                if current_eval < min_eval:
-                    min_eval = current_eval
-                    best_move = move
-                beta = min(beta, current_eval)
-                if beta <= alpha:
-                    break
-            return best_move, min_eval
-
-    def find_best_move(self, board):
-        return self.minimax(board, self.start_depth, -math.inf, math.inf, True)[0]
+            bound = EXACT
+        ply = position.ply - self.root_ply
+        if score >= DECISIVE_SCORE:
+            score += ply
+        elif score <= -DECISIVE_SCORE:
+            score -= ply
+        self.tt.store(position.hash, depth, bound, score, best_move)
+
+    @staticmethod
+    def _from_tt(score, ply):
+        """ A transposition table score, mates counted from the node, with mates counted from the root """
+        if score >= DECISIVE_SCORE:
+            return score - ply
+        if score <= -DECISIVE_SCORE:
+            return score + ply
+        return score
+
+    def stop(self):
+        """
+        Asks a running search to return its last completed result, safe to call from another thread. The request
+        stands until clear_stop(), so a search started on another thread also stops if this comes before it began.
+        """
+        self.stopped = True
+
+    def clear_stop(self):
+        """ Withdraws a stop request, called before starting a search that stop() may be used on """
+        self.stopped = False
+
+    def book_move(self, position):
+        """ Move from the opening book, or None without a book or when the position is not in it """
+        return self.book.choose(position) if self.book is not None else None
+
+    def find_best_move(self, board, **limits):
+        """
+        The best move as a view Move, or None, the principal variation behind it as compact moves and the
+        SearchStats of the search, None for a book move
+        """
+        best_move = self.book_move(board.position)
+        stats = None
+        if best_move is None:
+            best_move = self.search(board.position, **limits)
+            stats = self.stats
+        pv = self.pv if self.pv[:1] == [best_move] else [best_move]
+        return (board.view_move(best_move), pv, stats) if best_move is not None else (None, [], stats)
+
+    def search(self, position, depth=None, movetime=None, nodes=None, infinite=False, wtime=None, btime=None,
+               winc=0, binc=0, movestogo=None, ponder=False):
+        """
+        Iterative deepening from depth 1 until a limit is hit. With no limits given the search runs to
+        start_depth. Returns the best move of the last iteration that finished, its principal variation left in
+        `pv` and its SearchStats in `stats`. A ponder search ignores its time limits until ponderhit() is called,
+        and is otherwise ended by stop().
+        """
+        start = time.time()
+        self.nodes = 0
+        self.node_limit = nodes
+        self.soft_deadline = self.hard_deadline = None
+        self.search_start = start
+        self._time_limits = (position.side, movetime, wtime, btime, winc, binc, movestogo)
+        self.pondering = ponder
+        self.completed_depth = 0
+        self.root_ply = position.ply
+        self.killers = [[None, None] for ply in range(MAX_PLY)]
+        for scores in self.history:
+            for to in range(64):
+                scores[to] >>= 1
+
+        if not ponder:
+            self._set_deadlines()
+        if depth is None:
+            clock = wtime if position.side == WHITE else btime
+            limited = infinite or ponder or nodes is not None or movetime is not None or clock is not None
+            depth = MAX_DEPTH if limited else self.start_depth
+
+        self.stats = SearchStats()
+        self.tt.new_search()
+        self.tt.reset_stats()
+        with instrument(self.stats, self.timing, self.profile, self.trace_memory):
+            best_move = self._iterate(position, depth, start)
+        stats = self.stats
+        stats.nodes = self.nodes
+        stats.depth = self.completed_depth
+        stats.seldepth = max(stats.seldepth, stats.depth)
+        stats.tt_probes = self.tt.hits + self.tt.misses
+        stats.tt_hits = self.tt.hits
+        stats.seconds = time.time() - start
+        if self.search_log is not None:
+            self.search_log.write(stats, hash=f"{position.hash:016x}", move=move_name(best_move) if best_move else None)
+        return best_move
+
+    def ponderhit(self):
+        """
+        The expected move was played: a ponder search goes on as a normal one, its time counted from when it
+        started so that time spent pondering shortens the reply. Safe to call from another thread.
+        """
+        if self.pondering:
+            self._set_deadlines()
+            self.pondering = False
+
+    def _set_deadlines(self):
+        """ Deadlines for the time limits of the current search, none of them before now """
+        side, movetime, wtime, btime, winc, binc, movestogo = self._time_limits
+        start, now = self.search_start, time.time()
+        clock, increment = (wtime, winc) if side == WHITE else (btime, binc)
+        if movetime is not None:
+            self.soft_deadline = self.hard_deadline = max(now, start + movetime / 1000)
+        elif clock is not None:
+            budget = clock / (movestogo or DEFAULT_MOVES_TO_GO) + increment * 0.8
+            self.soft_deadline = max(now, start + budget / 2000)
+            self.hard_deadline = max(now, start + min(budget * 3, clock / 2) / 1000)
+
+    def _iterate(self, position, depth, start):
+        """ The deepening loop of search """
+        self.pv = []
+        moves = position.legal_moves()
+        if not moves:
+            return None
+        best_move = moves[0]
+        for current_depth in range(1, depth + 1):
+            try:
+                pv, score = self._search_root(position, current_depth)
+            except SearchStopped:
+                while position.ply > self.root_ply:
+                    position.unmake()
+                break
+            if pv:
+                self.pv = pv
+                best_move = pv[0]
+            self.score = score * position.side
+            self.completed_depth = current_depth
+            if self.on_iteration is not None:
+                self.on_iteration(current_depth, self.score, best_move, self.nodes, time.time() - start)
+            if self.soft_deadline is not None and time.time() >= self.soft_deadline:
+                break
+        return best_move
+
+    def _search_root(self, position, depth):
+        """
+        One iteration of the deepening loop, returning (principal variation, score for the side to move) or
+        raising SearchStopped. Deeper iterations start with an aspiration window around the last score.
+        """
+        alpha, beta = -math.inf, math.inf
+        delta = ASPIRATION_WINDOW
+        if depth >= ASPIRATION_DEPTH:
+            guess = self.score * position.side
+            alpha, beta = guess - delta, guess + delta
+        while True:
+            self.following_pv = True
+            score = self.negamax(position, depth, alpha, beta)
+            if score <= alpha:
+                alpha = -math.inf if delta > ASPIRATION_LIMIT else score - delta
+            elif score >= beta:
+                beta = math.inf if delta > ASPIRATION_LIMIT else score + delta
+            else:
+                return self.pv_table[0][:self.pv_length[0]], score
+            delta *= 2
+            self.stats.aspiration_re_searches += 1
+
+    def _check_limits(self):
+        if self.stopped:
+            raise SearchStopped
+        if self.node_limit is not None and self.nodes >= self.node_limit:
+            raise SearchStopped
+        if self.hard_deadline is not None and time.time() >= self.hard_deadline:
+            raise SearchStopped
@@ -0,0 +1,217 @@
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+from ai import ChessAI
+from position import Position, move_name
+from pgn import read_games
+
+# Positions handed to the pool ahead of the results read back, per worker. This bounds both the input read
+# ahead and, in input order, the results held back waiting for an earlier one.
+IN_FLIGHT_PER_WORKER = 4
+# Seconds between checkpoint saves
+CHECKPOINT_INTERVAL = 5.0
+
+# ChessAI of a pool worker, set up once by _init_worker
+_worker = None
+
+
+class AnalysisResult:
+    """ Outcome of analysing one position: best move and PV in coordinate notation, white relative score """
+
+    def __init__(self, index, fen, move=None, score=None, pv=None, depth=0, nodes=0, seconds=0.0, error=None):
+        self.index = index
+        self.fen = fen
+        self.move = move
+        self.score = score
+        self.pv = pv or []
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        # why the position could not be analysed, such as a malformed FEN
+        self.error = error
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    def __repr__(self):
+        if self.error:
+            return f"AnalysisResult({self.index}, error {self.error!r})"
+        return f"AnalysisResult({self.index}, {self.move} {self.score} depth {self.depth}, pv {' '.join(self.pv)})"
+
+
+class Checkpoint:
+    """
+    Indices of the positions analysed so far, saved to a JSON file from time to time so an interrupted run can
+    resume. Only the first index not yet done and the done ones after it are kept, so memory stays small when
+    results come back roughly in order.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.next = 0
+        self.ahead = set()
+        self.saved = time.time()
+        if os.path.exists(path):
+            with open(path) as file:
+                state = json.load(file)
+            self.next = state["next"]
+            self.ahead = set(state["ahead"])
+
+    def __contains__(self, index):
+        return index < self.next or index in self.ahead
+
+    def add(self, index):
+        self.ahead.add(index)
+        while self.next in self.ahead:
+            self.ahead.remove(self.next)
+            self.next += 1
+        if time.time() - self.saved >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def save(self):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as file:
+            json.dump({"next": self.next, "ahead": sorted(self.ahead)}, file)
+        os.replace(temporary, self.path)
+        self.saved = time.time()
+
+
+def _init_worker(tt_size_mb):
+    global _worker
+    _worker = ChessAI("white", tt_size_mb)
+
+
+def _analyse(task):
+    index, fen, limits = task
+    start = time.time()
+    try:
+        position = Position(fen)
+        ai = _worker
+        move = ai.search(position, **limits)
+    except Exception as error:
+        return AnalysisResult(index, fen, error=f"{type(error).__name__}: {error}")
+    if move is None:
+        return AnalysisResult(index, fen, seconds=time.time() - start)
+    return AnalysisResult(index, fen, move_name(move), ai.score, [move_name(m) for m in ai.pv], ai.completed_depth,
+                          ai.nodes, time.time() - start)
+
+
+def analyse(positions, workers=None, ordered=False, checkpoint=None, tt_size_mb=16, **limits):
+    """
+    Analyses FENs with a pool of ChessAI worker processes, yielding an AnalysisResult for each. `positions` can
+    also hold (fen, limits) pairs whose limits override the ChessAI.search limits given here. Results come in
+    completion order, or in input order with `ordered`. At most IN_FLIGHT_PER_WORKER positions per worker are
+    taken from `positions` ahead of the results consumed, so a long input never has to fit in memory.
+    With a checkpoint path, positions recorded there as done are skipped; a result counts as done once the
+    generator has yielded it, so a resumed run may repeat the last few results before an interruption.
+    Workers keep their transposition tables from one position to the next.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    window = workers * IN_FLIGHT_PER_WORKER
+    done = Checkpoint(checkpoint) if checkpoint else None
+    results = queue.Queue()
+    pending = set()
+    # results that came back ahead of an earlier position, by index, for ordered output
+    held = {}
+    tasks = iter(enumerate(positions))
+    exhausted = False
+    next_index = None
+
+    with multiprocessing.get_context("spawn").Pool(workers, _init_worker, (tt_size_mb,)) as pool:
+        try:
+            while True:
+                while not exhausted and len(pending) + len(held) < window:
+                    item = next(tasks, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    index, position = item
+                    if done is not None and index in done:
+                        continue
+                    fen, overrides = (position, {}) if isinstance(position, str) else position
+                    if next_index is None:
+                        next_index = index
+                    pending.add(index)
+                    pool.apply_async(_analyse, ((index, fen, dict(limits, **overrides)),),
+                                     callback=results.put, error_callback=results.put)
+                if not pending:
+                    break
+                result = results.get()
+                if isinstance(result, BaseException):
+                    raise result
+                pending.discard(result.index)
+                if not ordered:
+                    yield result
+                    if done is not None:
+                        done.add(result.index)
+                    continue
+                held[result.index] = result
+                # pending and held together cover every index from next_index on that was handed out
+                while held and next_index in held:
+                    result = held.pop(next_index)
+                    yield result
+                    if done is not None:
+                        done.add(result.index)
+                    next_index = min(pending | held.keys(), default=None)
+        finally:
+            if done is not None:
+                done.save()
+
+
+def read_positions(path):
+    """
+    Generator of the FENs in a file: every position before a move in the games of a .pgn file, otherwise one
+    FEN or EPD position per line, skipping blank lines and lines starting with #
+    """
+    if path.endswith(".pgn"):
+        with open(path, "rb") as file:
+            for game in read_games(file):
+                for position, move in game.replay():
+                    yield position.fen()
+        return
+    with open(path) as file:
+        yield from read_fens(file)
+
+
+def read_fens(lines):
+    """ Generator of the FENs in FEN or EPD lines, skipping blank lines and lines starting with # """
+    for line in lines:
+        fields = line.split()
+        if not fields or fields[0].startswith("#"):
+            continue
+        # EPD has no move counters, its operations follow the en passant field
+        if len(fields) > 4 and not fields[4].isdigit():
+            fields = fields[:4]
+        yield " ".join(fields[:6])
+
+
+if __name__ == '__main__':
+    # python analysis.py <positions file> [options]: one JSON result per line, the file FEN, EPD or PGN
+    parser = argparse.ArgumentParser(description="Analyses positions with a pool of ChessAI processes")
+    parser.add_argument("positions", help="FEN or EPD lines, a .pgn file for every position of its games, or -")
+    parser.add_argument("--depth", type=int)
+    parser.add_argument("--movetime", type=int, help="milliseconds per position")
+    parser.add_argument("--nodes", type=int)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--hash", type=int, default=16, help="transposition table MB per worker")
+    parser.add_argument("--ordered", action="store_true", help="write results in input order")
+    parser.add_argument("--checkpoint", help="file recording progress, to resume an interrupted run")
+    parser.add_argument("--output", help="file results are appended to instead of standard output")
+    args = parser.parse_args()
+
+    limits = {name: getattr(args, name) for name in ("depth", "movetime", "nodes") if getattr(args, name)}
+    if not limits:
+        limits["depth"] = 4
+    source = read_fens(sys.stdin) if args.positions == "-" else read_positions(args.positions)
+    output = open(args.output, "a") if args.output else sys.stdout
+    try:
+        for result in analyse(source, args.workers, args.ordered, args.checkpoint, args.hash, **limits):
+            output.write(json.dumps(result.as_dict()) + "\n")
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
@@ -0,0 +1,51 @@
+from const import *
+
+# Lookup tables built once at import, indexed by the row * 8 + col squares of the Position mailbox.
+# Rays run outwards from the square and are left out when they would be empty.
+
+KNIGHT_OFFSETS = ((2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2))
+KING_OFFSETS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+DIAGONAL_DIRS = ((-1, 1), (-1, -1), (1, 1), (1, -1))
+ORTHOGONAL_DIRS = ((-1, 0), (0, 1), (1, 0), (0, -1))
+
+
+def _on_board(row, col):
+    return 0 <= row < ROWS and 0 <= col < COLS
+
+
+def _targets(sq, offsets):
+    row, col = sq >> 3, sq & 7
+    return tuple((row + dr) * COLS + col + dc for dr, dc in offsets if _on_board(row + dr, col + dc))
+
+
+def _rays(sq, dirs):
+    rays = []
+    for dr, dc in dirs:
+        row, col = (sq >> 3) + dr, (sq & 7) + dc
+        ray = []
+        while _on_board(row, col):
+            ray.append(row * COLS + col)
+            row += dr
+            col += dc
+        if ray:
+            rays.append(tuple(ray))
+    return tuple(rays)
+
+
+def _pawn_captures(sq, side):
+    # white pawns (side 1) move towards row 0
+    row, col = (sq >> 3) - side, sq & 7
+    if not 0 <= row < ROWS:
+        return ()
+    return tuple(row * COLS + c for c in (col - 1, col + 1) if 0 <= c < COLS)
+
+
+KNIGHT_TARGETS = tuple(_targets(sq, KNIGHT_OFFSETS) for sq in range(64))
+KING_TARGETS = tuple(_targets(sq, KING_OFFSETS) for sq in range(64))
+DIAGONAL_RAYS = tuple(_rays(sq, DIAGONAL_DIRS) for sq in range(64))
+ORTHOGONAL_RAYS = tuple(_rays(sq, ORTHOGONAL_DIRS) for sq in range(64))
+ALL_RAYS = tuple(DIAGONAL_RAYS[sq] + ORTHOGONAL_RAYS[sq] for sq in range(64))
+# PAWN_CAPTURES[side][sq]: squares a pawn of `side` on `sq` attacks; indexed by side like Position.king
+PAWN_CAPTURES = (None,
+                 tuple(_pawn_captures(sq, 1) for sq in range(64)),
+                 tuple(_pawn_captures(sq, -1) for sq in range(64)))
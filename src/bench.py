@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+from ai import ChessAI
+from parallel import ParallelChessAI
+from position import Position
+
+BENCH_FENS = [
+    "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+    "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4",
+    "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+    "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+    "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+    "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+]
+
+
+def search_nodes(fen, depth, **options):
+    """ Nodes and seconds a fresh ChessAI needs to search `fen` to `depth` """
+    ai = ChessAI("white")
+    for name, value in options.items():
+        setattr(ai, name, value)
+    start = time.time()
+    ai.search(Position(fen), depth=depth)
+    return ai.nodes, time.time() - start
+
+
+def ordering_report(depth=4):
+    """ Prints the nodes move ordering saves on every bench position """
+    total_plain = total_ordered = 0
+    for fen in BENCH_FENS:
+        plain, plain_time = search_nodes(fen, depth, ordering=False)
+        ordered, ordered_time = search_nodes(fen, depth, ordering=True)
+        total_plain += plain
+        total_ordered += ordered
+        print(f"{plain:>10} {ordered:>10} {1 - ordered / plain:>7.1%} {plain_time:>7.2f}s {ordered_time:>7.2f}s  {fen}")
+    print(f"{total_plain:>10} {total_ordered:>10} {1 - total_ordered / total_plain:>7.1%}  total at depth {depth}")
+
+
+def stats_report(depth=4, timing=True):
+    """ Prints the search statistics of every bench position, with the time per section unless timing is off """
+    for fen in BENCH_FENS:
+        ai = ChessAI("white")
+        ai.timing = timing
+        ai.search(Position(fen), depth=depth)
+        stats = ai.stats
+        print(f"{stats.nodes:>9} nodes ({stats.qnodes:>8} quiescence) {stats.nps:>7.0f} nps  "
+              f"seldepth {stats.seldepth:>2}  cutoffs {stats.cutoff_rate:>6.1%} "
+              f"(first move {stats.first_move_cutoff_rate:>6.1%})  tt hits {stats.tt_hit_rate:>6.1%}  "
+              f"movegen {stats.movegen_seconds:>6.2f}s  check {stats.check_seconds:>6.2f}s  "
+              f"eval {stats.eval_seconds:>6.2f}s  of {stats.seconds:>6.2f}s")
+
+
+def selective_report(movetime=1000):
+    """ Prints the depth reached in `movetime` ms without selective search, with each technique alone and with all """
+    switches = ("null_move", "late_move_reductions", "futility", "reverse_futility")
+    configs = [("none", ())] + [(name, (name,)) for name in switches] + [("all", switches)]
+    for label, enabled in configs:
+        depths = []
+        nodes = 0
+        for fen in BENCH_FENS:
+            ai = ChessAI("white")
+            for name in switches:
+                setattr(ai, name, name in enabled)
+            ai.search(Position(fen), movetime=movetime)
+            depths.append(ai.completed_depth)
+            nodes += ai.nodes
+        print(f"{label:>20}  depth {sum(depths) / len(depths):>5.2f} {str(depths):>22}  {nodes:>9} nodes")
+
+
+def scaling_report(depth=4, max_workers=None):
+    """
+    Prints time, nodes per second and speedup of the parallel search from 1 to max_workers processes, the
+    speedup measured against the serial ChessAI
+    """
+    max_workers = max_workers or os.cpu_count()
+    base_time = None
+    for workers in range(0, max_workers + 1):
+        ai = ParallelChessAI("white", workers=workers) if workers else ChessAI("white")
+        # start the pool outside the timed region
+        ai.search(Position(), depth=1)
+        nodes = 0
+        start = time.time()
+        for fen in BENCH_FENS:
+            ai.search(Position(fen), depth=depth)
+            nodes += ai.nodes
+        elapsed = time.time() - start
+        if workers:
+            ai.close()
+        base_time = base_time or elapsed
+        label = f"{workers:>3} workers" if workers else "     serial"
+        print(f"{label} {elapsed:>8.2f}s {nodes:>10} nodes {nodes / elapsed:>10.0f} nps "
+              f"{base_time / elapsed:>5.2f}x speedup")
+
+
+if __name__ == '__main__':
+    report = sys.argv[1] if len(sys.argv) > 1 else "ordering"
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    if report == "parallel":
+        scaling_report(depth, int(sys.argv[3]) if len(sys.argv) > 3 else None)
+    elif report == "stats":
+        stats_report(depth)
+    elif report == "selective":
+        # the second argument is milliseconds per position here
+        selective_report(int(sys.argv[2]) if len(sys.argv) > 2 else 1000)
+    else:
+        ordering_report(depth)
@@ -1,155 +1,141 @@
 from square import Square
 from move import Move
-from sound import Sound
 from piece import *
+from position import *
 from const import *
+from pgn import read_game, format_game
+
+PIECE_CLASSES = {PAWN: Pawn, KNIGHT: Knight, BISHOP: Bishop, ROOK: Rook, QUEEN: Queen, KING: King}
+
 
 class Board:
-    def __init__(self):
+    """ Square/Piece view of a compact Position, kept in sync on every move for the GUI """
+
+    def __init__(self, fen=START_FEN):
         self.squares = [[0, 0, 0, 0, 0, 0, 0, 0] for col in range(COLS)]
         self.moves = []
+        self.start_fen = fen
+        self.position = Position(fen)
+        self._codes = [EMPTY] * 64
         self._create()
-        self._add_piece("white")
-        self._add_piece("black")
-        self.white_score = 39
-        self.black_score = 39
+        self._sync()
+
+    @classmethod
+    def from_fen(cls, fen):
+        return cls(fen)
+
+    def to_fen(self):
+        return self.position.fen()
+
+    @classmethod
+    def from_pgn(cls, text):
+        """ Board after the moves of the first game in PGN `text`, up to the first move that is not legal """
+        game = read_game(text)
+        if game is None:
+            return cls()
+        board = cls(game.fen)
+        for san in game.moves:
+            if not board.move_san(san):
+                break
+        return board
+
+    def to_pgn(self, tags=None):
+        """ PGN of the game played on this board """
+        position = self.position
+        moves = [record[UNDO_MOVE] for record in position.stack[:position.ply]]
+        return format_game(tags or {}, moves, self.result(), self.start_fen)
+
+    @property
+    def white_score(self):
+        return sum(PIECE_VALUES[code] for code in self.position.squares if code > 0) // 100
+
+    @property
+    def black_score(self):
+        return sum(PIECE_VALUES[-code] for code in self.position.squares if code < 0) // 100
 
     def move(self, piece, move):
         initial = move.initial
         final = move.final
+        m = self.position.find_move(square(initial.row, initial.col), square(final.row, final.col))
+        if m is not None:
+            self._make(piece, m)
+
+    def move_san(self, san):
+        """ Makes a move given in SAN, returning whether it was legal """
+        m = self.position.parse_san(san)
+        if m is None:
+            return False
+        frm = move_from(m)
+        self._make(self.squares[frm >> 3][frm & 7].piece, m)
+        return True
 
-        # Capture the initial state of the move
+    def san(self, move):
+        """ SAN of a view Move of the side to move, promoting to a queen """
+        initial, final = move.initial, move.final
+        m = self.position.find_move(square(initial.row, initial.col), square(final.row, final.col))
+        return self.position.san(m) if m is not None else None
+
+    def _make(self, piece, m):
+        frm, to = move_from(m), move_to(m)
+        initial, final = Square(frm >> 3, frm & 7), Square(to >> 3, to & 7)
         piece_taken = self.squares[final.row][final.col].piece
-        en_passant_empty = self.squares[final.row][final.col].is_empty()
-
-        # Update score
-        if piece_taken:
-            if piece_taken.color == "white":
-                self.white_score -= abs(piece_taken.value)
-            else:
-                self.black_score -= abs(piece_taken.value)
-
-        # Update the board
-        self.squares[initial.row][initial.col].piece = None
-        self.squares[final.row][final.col].piece = piece
-
-        # Handle en passant
-        if isinstance(piece, Pawn):
-            diff = final.col - initial.col
-            if diff != 0 and en_passant_empty:
-                piece_taken = self.squares[initial.row][initial.col + diff].piece
-                self.squares[initial.row][initial.col + diff].piece = None
-                self.moves.append(Move(initial, final, piece, piece_taken, en_passant=True,
-                                       en_passant_row=initial.row, en_passant_col=initial.col + diff))
-                if piece_taken:
-                    if piece_taken.color == "white":
-                        self.white_score -= abs(piece_taken.value)
-                    else:
-                        self.black_score -= abs(piece_taken.value)
-            else:
-                self.check_promotion(piece, final)
-                self.moves.append(Move(initial, final, piece, piece_taken,
-                                       promotion=(final.row == 0 or final.row == 7)))
-        else:
-            self.moves.append(Move(initial, final, piece, piece_taken))
-        # Handle castling
-        if isinstance(piece, King):
-            if self.castling(initial, final):
-                self.moves.pop()
-                diff = final.col - initial.col
-                rook = piece.left_rook if (diff < 0) else piece.right_rook
-                if (len(rook.moves) > 0):
-                    self.move(rook, rook.moves[-1])
-                    self.moves.append(Move(initial, final, piece, piece_taken=None, castle=True))
-
-        # Update piece state
-        piece.moved = True
+        en_passant = move_flag(m) == EN_PASSANT_FLAG
+        if en_passant:
+            piece_taken = self.squares[initial.row][final.col].piece
+        self.position.make(m)
+        self.moves.append(Move(initial, final, piece, piece_taken,
+                               en_passant_row=initial.row if en_passant else None,
+                               en_passant_col=final.col if en_passant else None,
+                               promotion=move_promotion(m) != 0, en_passant=en_passant,
+                               castle=move_flag(m) == CASTLE_FLAG))
         piece.clear_moves()
+        self._sync()
 
     def undo_move(self):
         if not self.moves:
             return False
 
-        last_move = self.moves.pop()
-        last_initial = last_move.initial
-        last_final = last_move.final
-        moved_piece = last_move.piece_moved
-        piece_taken = last_move.piece_taken
-
-        if piece_taken:
-            if piece_taken.color == "white":
-                self.white_score += abs(piece_taken.value)
-            else:
-                self.black_score += abs(piece_taken.value)
-
-        # Move the piece back to its original position
-        self.squares[last_initial.row][last_initial.col].piece = moved_piece
-        self.squares[last_final.row][last_final.col].piece = piece_taken
-
-        # Handle en passant
-        if isinstance(moved_piece, Pawn):
-            if last_move.en_passant:
-                self.squares[last_move.en_passant_row][last_move.en_passant_col].piece = piece_taken
-                self.squares[last_final.row][last_final.col].piece = None
-
-            elif last_move.promotion:
-                # Restore the pawn instead of the promoted piece
-                self.squares[last_initial.row][last_initial.col].piece = Pawn(moved_piece.color)
-                self.squares[last_final.row][last_final.col].piece = piece_taken
-        # Handle castling
-        elif isinstance(last_move.piece_moved, King):
-            if last_move.castle:
-                self.undo_move()
-
-        moved_piece.moved = False
-        moved_piece.clear_moves()
-
+        self.moves.pop()
+        self.position.unmake()
+        self._sync()
         return True
 
+    def last_move(self):
+        """ Compact move made last, None before the first move """
+        position = self.position
+        return position.stack[position.ply - 1][UNDO_MOVE] if position.ply else None
+
     def get_moves(self, color):
-        all_moves = []
-        for row in range(ROWS):
-            for col in range(COLS):
-                piece = self.squares[row][col].piece
-                if piece and piece.color == color:
-                    self.calc_move(piece, row, col, bool=True)
-                    all_moves.extend(piece.moves)
-                    piece.clear_moves()
-        return all_moves
+        if (color == "white") != (self.position.side == WHITE):
+            return []
+        return [self.view_move(m) for m in self.position.legal_moves()]
+
+    def view_move(self, m):
+        """ Converts a compact move into a Move between view squares """
+        frm, to = move_from(m), move_to(m)
+        initial = self.squares[frm >> 3][frm & 7]
+        final = self.squares[to >> 3][to & 7]
+        return Move(Square(initial.row, initial.col, initial.piece), Square(final.row, final.col, final.piece))
 
     def valid_move(self, piece, move):
         return move in piece.moves
 
-    def check_promotion(self, piece, final):
-        if final.row == 0 or final.row == 7:
-            self.squares[final.row][final.col].piece = Queen(piece.color)
-
     def castling(self, initial, final):
         return abs(initial.col - final.col) == 2
 
-    def set_true_en_passant(self, piece):
-        if not isinstance(piece, Pawn):
-            return
-        for row in range(ROWS):
-            for col in range(COLS):
-                if isinstance(self.squares[row][col].piece, Pawn):
-                    self.squares[row][col].piece.en_passant = False
-        piece.en_passant = True
-
     def in_check(self, piece, move):
-        temp_piece = deepcopy(piece)
-        temp_board = deepcopy(self)
-        temp_board.move(temp_piece, move)
-
-        for row in range(ROWS):
-            for col in range(COLS):
-                if temp_board.squares[row][col].has_enemy_piece(piece.color):
-                    p = temp_board.squares[row][col].piece
-                    temp_board.calc_move(p, row, col, bool=False)
-                    for m in p.moves:
-                        if isinstance(m.final.piece, King):
-                            return True
-        return False
+        """ Whether making `move` leaves the king of `piece`'s color, which must be on move, in check """
+        position = self.position
+        side = WHITE if piece.color == "white" else BLACK
+        frm = square(move.initial.row, move.initial.col)
+        to = square(move.final.row, move.final.col)
+        m = next((m for m in position.pseudo_moves() if move_from(m) == frm and move_to(m) == to), None)
+        if m is None:
+            return False
+        position.make(m)
+        check = position.attacked(position.king[side], -side)
+        position.unmake()
+        return check
 
     def calc_move(self, piece, row, col, bool=True):
         """ Calculates the valid moves of a specific piece in a given position """
@@ -160,39 +146,30 @@ class Board:
             for col in range(COLS):
                 self.squares[row][col] = Square(row, col)
 
+    def _sync(self):
+        codes = self.position.squares
+        for sq in range(64):
+            code = codes[sq]
+            if code != self._codes[sq]:
+                color = "white" if code > 0 else "black"
+                self.squares[sq >> 3][sq & 7].piece = PIECE_CLASSES[abs(code)](color) if code else None
+                self._codes[sq] = code
+
     def game_over(self):
-        # Check if there are no valid moves for the current player
-        current_player = "white" if len(self.moves) % 2 == 0 else "black"
-        if not self.get_moves(current_player):
-            # If current player is in check, it's checkmate
-            if self.in_check(self.squares[self.moves[-1].final.row][self.moves[-1].final.col].piece,
-                             Move(self.moves[-1].initial, self.moves[-1].final)):
-                return "checkmate"
-            # If not in check and no valid moves, it's stalemate
-            return "stalemate"
-        return False
-
-    def _add_piece(self, color):
-        row_pawn, row_other = (6, 7) if color == "white" else (1, 0)
-
-        # pawns
-        for col in range(COLS):
-            self.squares[row_pawn][col] = Square(row_pawn, col, Pawn(color))
-
-        # knights
-        self.squares[row_other][1] = Square(row_other, 1, Knight(color))
-        self.squares[row_other][6] = Square(row_other, 6, Knight(color))
-
-        # bishops
-        self.squares[row_other][2] = Square(row_other, 2, Bishop(color))
-        self.squares[row_other][5] = Square(row_other, 5, Bishop(color))
-
-        # rooks
-        self.squares[row_other][0] = Square(row_other, 0, Rook(color))
-        self.squares[row_other][7] = Square(row_other, 7, Rook(color))
-
-        # queen
-        self.squares[row_other][3] = Square(row_other, 3, Queen(color))
-
-        # king
-        self.squares[row_other][4] = Square(row_other, 4, King(color))
+        position = self.position
+        if position.is_repetition(2):
+            return "threefold repetition"
+        if position.has_legal_move():
+            return "fifty-move rule" if position.halfmove >= 100 else False
+        # If current player is in check, it's checkmate
+        if position.in_check():
+            return "checkmate"
+        # If not in check and no valid moves, it's stalemate
+        return "stalemate"
+
+    def result(self):
+        """ PGN result of the game so far, "*" while it goes on """
+        over = self.game_over()
+        if over == "checkmate":
+            return "0-1" if self.position.side == WHITE else "1-0"
+        return "1/2-1/2" if over else "*"
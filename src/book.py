@@ -0,0 +1,65 @@
+import mmap
+import os
+import random
+import struct
+from polyglot import polyglot_key, decode_move
+
+# Polyglot entries: key, move, weight and learn fields, big endian, sorted by key
+ENTRY = struct.Struct(">QHHI")
+KEY = struct.Struct(">Q")
+
+
+class OpeningBook:
+    """
+    Polyglot .bin opening book. The file is memory mapped rather than read, and the entries of a position are
+    found by binary search over the sorted keys, so opening even a very large book costs nothing and a lookup
+    touches O(log n) entries. With randomize=True moves are picked with probability proportional to their weight,
+    otherwise the heaviest move is played.
+    """
+
+    def __init__(self, path, randomize=False):
+        self.path = path
+        self.randomize = randomize
+        self.map = None
+        self.count = 0
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            # an empty file cannot be mapped, it is just an empty book
+            if size >= ENTRY.size:
+                self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                self.count = size // ENTRY.size
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+            self.count = 0
+
+    def entries(self, position):
+        """ (move, weight) pairs stored for the position, skipping moves that are not legal in it """
+        key = polyglot_key(position)
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.map, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        for index in range(low, self.count):
+            entry_key, book_move, weight, learn = ENTRY.unpack_from(self.map, index * ENTRY.size)
+            if entry_key != key:
+                break
+            move = decode_move(position, book_move)
+            if move is not None:
+                found.append((move, weight))
+        return found
+
+    def choose(self, position):
+        """ Book move for the position, or None when the book has nothing for it """
+        found = self.entries(position)
+        if not found:
+            return None
+        if self.randomize and sum(weight for move, weight in found) > 0:
+            return random.choices([move for move, weight in found], [weight for move, weight in found])[0]
+        return max(found, key=lambda entry: entry[1])[0]
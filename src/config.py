@@ -2,6 +2,7 @@ import pygame
 import os
 
 from sound import Sound
+from textures import Textures
 from theme import Theme
 
 class Config:
@@ -13,6 +14,7 @@ class Config:
         self.font = pygame.font.SysFont("monospace", 18, bold=True)
         self.move_sound = Sound("../assets/sounds/assets_sounds_move.wav")
         self.capture_sound = Sound("../assets/sounds/assets_sounds_capture.wav")
+        self.textures = Textures()
 
     def change_theme(self):
         self.idx += 1
@@ -3,3 +3,18 @@ HEIGHT = 800
 ROWS = 8
 COLS = 8
 SQUARE_SIZE = WIDTH // COLS
+# Texture size of the piece under the mouse while dragging
+DRAG_SIZE = 128
+# Upper bound on frames drawn per second
+FPS = 60
+
+# Milliseconds the AI may think per move
+AI_MOVE_TIME = 1000
+# Let the AI search the reply it expects while the player is thinking
+PONDER = True
+# Polyglot opening book the AI plays from when the file exists
+BOOK_FILE = "../assets/books/book.bin"
+# Endgame tables written by tablebase.py, probed by the AI when the directory exists
+TABLEBASE_DIR = "../assets/tablebases"
+# JSON lines file the GUI appends the statistics of every AI search to, None to keep no log
+SEARCH_LOG = None
@@ -1,4 +1,3 @@
-import pygame
 from const import *
 
 class Dragger:
@@ -10,20 +9,19 @@ class Dragger:
         self.initial_row = 0
         self.initial_col = 0
 
-    def update_blit(self, screen):
-        piece = self.piece
-        # make texture bigger
-        piece.set_texture(size=128)
-
-        # img
-        img = pygame.image.load(piece.texture)
+    def update_blit(self, screen, textures):
+        # bigger texture while dragging
+        img = textures.get(self.piece, size=DRAG_SIZE)
 
         # img center
         img_center = (self.mouseX, self.mouseY)
-        piece.texture_rect = img.get_rect(center=img_center)
 
         # update blit
-        screen.blit(img, piece.texture_rect)
+        screen.blit(img, img.get_rect(center=img_center))
+
+    def rect(self):
+        """ Area covered by the enlarged piece while dragging """
+        return (self.mouseX - DRAG_SIZE // 2, self.mouseY - DRAG_SIZE // 2, DRAG_SIZE, DRAG_SIZE)
 
     def update_mouse(self, pos):
         self.mouseX, self.mouseY = pos
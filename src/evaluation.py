@@ -0,0 +1,131 @@
+# Tapered evaluation terms. Every table is written from white's side with rank 8 first, so it is indexed by the
+# same row * 8 + col squares as the Position mailbox; black pieces look up the vertically mirrored square.
+
+# Sum of PHASE_WEIGHTS over the starting material, the phase of a pure middlegame
+MAX_PHASE = 24
+
+MG_VALUES = (0, 100, 320, 330, 500, 900, 0)
+EG_VALUES = (0, 120, 300, 320, 520, 920, 0)
+PHASE_WEIGHTS = (0, 0, 1, 1, 2, 4, 0)
+
+PAWN_MG = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    10, 10, 20, 30, 30, 20, 10, 10,
+    5, 5, 10, 25, 25, 10, 5, 5,
+    0, 0, 0, 20, 20, 0, 0, 0,
+    5, -5, -10, 0, 0, -10, -5, 5,
+    5, 10, 10, -20, -20, 10, 10, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+PAWN_EG = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    80, 80, 80, 80, 80, 80, 80, 80,
+    50, 50, 50, 50, 50, 50, 50, 50,
+    30, 30, 30, 30, 30, 30, 30, 30,
+    15, 15, 15, 15, 15, 15, 15, 15,
+    5, 5, 5, 5, 5, 5, 5, 5,
+    0, 0, 0, 0, 0, 0, 0, 0,
+    0, 0, 0, 0, 0, 0, 0, 0,
+)
+KNIGHT_TABLE = (
+    -50, -40, -30, -30, -30, -30, -40, -50,
+    -40, -20, 0, 0, 0, 0, -20, -40,
+    -30, 0, 10, 15, 15, 10, 0, -30,
+    -30, 5, 15, 20, 20, 15, 5, -30,
+    -30, 0, 15, 20, 20, 15, 0, -30,
+    -30, 5, 10, 15, 15, 10, 5, -30,
+    -40, -20, 0, 5, 5, 0, -20, -40,
+    -50, -40, -30, -30, -30, -30, -40, -50,
+)
+BISHOP_TABLE = (
+    -20, -10, -10, -10, -10, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 10, 10, 5, 0, -10,
+    -10, 5, 5, 10, 10, 5, 5, -10,
+    -10, 0, 10, 10, 10, 10, 0, -10,
+    -10, 10, 10, 10, 10, 10, 10, -10,
+    -10, 5, 0, 0, 0, 0, 5, -10,
+    -20, -10, -10, -10, -10, -10, -10, -20,
+)
+ROOK_TABLE = (
+    0, 0, 0, 0, 0, 0, 0, 0,
+    5, 10, 10, 10, 10, 10, 10, 5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    -5, 0, 0, 0, 0, 0, 0, -5,
+    0, 0, 0, 5, 5, 0, 0, 0,
+)
+QUEEN_TABLE = (
+    -20, -10, -10, -5, -5, -10, -10, -20,
+    -10, 0, 0, 0, 0, 0, 0, -10,
+    -10, 0, 5, 5, 5, 5, 0, -10,
+    -5, 0, 5, 5, 5, 5, 0, -5,
+    0, 0, 5, 5, 5, 5, 0, -5,
+    -10, 5, 5, 5, 5, 5, 0, -10,
+    -10, 0, 5, 0, 0, 0, 0, -10,
+    -20, -10, -10, -5, -5, -10, -10, -20,
+)
+KING_MG = (
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -30, -40, -40, -50, -50, -40, -40, -30,
+    -20, -30, -30, -40, -40, -30, -30, -20,
+    -10, -20, -20, -20, -20, -20, -20, -10,
+    20, 20, 0, 0, 0, 0, 20, 20,
+    20, 30, 10, 0, 0, 10, 30, 20,
+)
+KING_EG = (
+    -50, -40, -30, -20, -20, -30, -40, -50,
+    -30, -20, -10, 0, 0, -10, -20, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 30, 40, 40, 30, -10, -30,
+    -30, -10, 20, 30, 30, 20, -10, -30,
+    -30, -30, 0, 0, 0, 0, -30, -30,
+    -50, -30, -30, -30, -30, -30, -30, -50,
+)
+
+# (middlegame, endgame) square tables indexed by piece type
+SQUARE_TABLES = (
+    None,
+    (PAWN_MG, PAWN_EG),
+    (KNIGHT_TABLE, KNIGHT_TABLE),
+    (BISHOP_TABLE, BISHOP_TABLE),
+    (ROOK_TABLE, ROOK_TABLE),
+    (QUEEN_TABLE, QUEEN_TABLE),
+    (KING_MG, KING_EG),
+)
+
+
+def pack(mg, eg):
+    """ Both phase scores in one int, so a single addition updates both """
+    return (mg << 16) + eg
+
+
+def unpack(score):
+    eg = ((score + 0x8000) & 0xFFFF) - 0x8000
+    return (score - eg) >> 16, eg
+
+
+def _piece_square(kind):
+    mg_table, eg_table = SQUARE_TABLES[kind]
+    return [pack(MG_VALUES[kind] + mg_table[sq], EG_VALUES[kind] + eg_table[sq]) for sq in range(64)]
+
+
+# PIECE_SQUARE[code][sq]: packed, signed (white positive) value of piece `code` standing on `sq`.
+# Like the Zobrist keys, black codes -6..-1 wrap to the end of the list.
+PIECE_SQUARE = ([[0] * 64] + [_piece_square(kind) for kind in range(1, 7)]
+                + [[-_piece_square(kind)[sq ^ 56] for sq in range(64)] for kind in range(6, 0, -1)])
+# PHASE[code] for signed piece codes
+PHASE = PHASE_WEIGHTS + tuple(reversed(PHASE_WEIGHTS[1:]))
+
+
+def taper(score, phase):
+    """ Blends the packed middlegame and endgame scores by game phase """
+    mg, eg = unpack(score)
+    phase = min(phase, MAX_PHASE)
+    return (mg * phase + eg * (MAX_PHASE - phase)) // MAX_PHASE
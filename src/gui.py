@@ -12,8 +12,28 @@ class GUI:
         self.board = Board()
         self.dragger = Dragger()
         self.config = Config()
+        # board squares and labels drawn once per theme, keyed by theme index
+        self.backgrounds = {}
+
+    def show_all(self, screen, thinking=False):
+        self.show_bg(screen)
+        self.show_last_move(screen)
+        self.show_moves(screen)
+        self.show_pieces(screen)
+        self.show_hover(screen)
+        if self.dragger.dragging:
+            self.dragger.update_blit(screen, self.config.textures)
+        if thinking:
+            self.show_thinking(screen)
 
     def show_bg(self, screen):
+        if self.config.idx not in self.backgrounds:
+            background = pygame.Surface((WIDTH, HEIGHT)).convert()
+            self._draw_bg(background)
+            self.backgrounds[self.config.idx] = background
+        screen.blit(self.backgrounds[self.config.idx], (0, 0))
+
+    def _draw_bg(self, screen):
         theme = self.config.theme
         for row in range(ROWS):
             for col in range(COLS):
@@ -40,11 +60,9 @@ class GUI:
 
                     # All not being dragged
                     if piece is not self.dragger.piece:
-                        piece.set_texture(size=80)
-                        img = pygame.image.load(piece.texture)
+                        img = self.config.textures.get(piece, size=80)
                         img_center = col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2
-                        piece.texture_rect = img.get_rect(center=img_center)
-                        screen.blit(img, piece.texture_rect)
+                        screen.blit(img, img.get_rect(center=img_center))
 
     def show_moves(self, screen):
         theme = self.config.theme
@@ -74,6 +92,10 @@ class GUI:
             rect = (self.hovered_sqr.col * SQUARE_SIZE, self.hovered_sqr.row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE)
             pygame.draw.rect(screen, color, rect, width=3)
 
+    def show_thinking(self, screen):
+        lbl = self.config.font.render("Thinking...", 1, (150, 150, 150))
+        screen.blit(lbl, lbl.get_rect(topright=(WIDTH - 5, 5)))
+
     def next_turn(self):
         self.turn = "white" if self.turn == "black" else "black"
 
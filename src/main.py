@@ -1,12 +1,20 @@
 import pygame
 import sys
+import threading
+import os
 from const import *
 from gui import GUI
+from render import RenderScheduler
 from square import Square
 from ai import ChessAI
+from book import OpeningBook
+from tablebase import Tablebases
+from stats import SearchLog
 from piece import *
 from move import Move
-import time
+
+# Posted by the search thread with the chosen move
+AI_MOVE_EVENT = pygame.USEREVENT + 1
 
 class Main:
     def __init__(self):
@@ -14,9 +22,25 @@ class Main:
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("Chess")
         self.gui = GUI()
+        self.renderer = RenderScheduler()
         self.ai = ChessAI("black")
+        if os.path.exists(BOOK_FILE):
+            self.ai.book = OpeningBook(BOOK_FILE, randomize=True)
+        if os.path.isdir(TABLEBASE_DIR):
+            self.ai.tablebases = Tablebases(TABLEBASE_DIR)
+        if SEARCH_LOG:
+            self.ai.search_log = SearchLog(SEARCH_LOG)
+        self.ai_thread = None
+        # results of searches started before the latest cancel are ignored
+        self.search_id = 0
+        # player move the running search expects and searches the reply to, None when not pondering
+        self.ponder_move = None
+        # move found by a ponder search that ended before the player moved
+        self.ponder_result = None
 
     def mouse_down(self, gui, board, dragger, event):
+        if self.ai_thread is not None and self.ponder_move is None:
+            return
         dragger.update_mouse(event.pos)
         clicked_row = dragger.mouseY // SQUARE_SIZE
         clicked_col = dragger.mouseX // SQUARE_SIZE
@@ -26,22 +50,21 @@ class Main:
                 board.calc_move(piece, clicked_row, clicked_col, bool=True)
                 dragger.save_initial(event.pos)
                 dragger.drag_piece(piece)
-                gui.show_bg(self.screen)
-                gui.show_last_move(self.screen)
-                gui.show_moves(self.screen)
+                self.renderer.invalidate()
 
     def mouse_motion(self, gui, dragger, event):
         motion_row = event.pos[1] // SQUARE_SIZE
         motion_col = event.pos[0] // SQUARE_SIZE
+        hovered = gui.hovered_sqr
         gui.set_hover(motion_row, motion_col)
+        if gui.hovered_sqr is not hovered:
+            for sqr in (hovered, gui.hovered_sqr):
+                if sqr is not None:
+                    self.renderer.invalidate_square(sqr.row, sqr.col)
         if dragger.dragging:
+            self.renderer.invalidate(dragger.rect())
             dragger.update_mouse(event.pos)
-            gui.show_bg(self.screen)
-            gui.show_last_move(self.screen)
-            gui.show_moves(self.screen)
-            gui.show_pieces(self.screen)
-            gui.show_hover(self.screen)
-            dragger.update_blit(self.screen)
+            self.renderer.invalidate(dragger.rect())
 
     def mouse_up(self, gui, board, dragger, event):
         if dragger.dragging:
@@ -59,25 +82,80 @@ class Main:
                                           isinstance(board.squares[initial.row][initial.col].piece, Pawn))
                     captured = normal_capture or en_passant_capture
                     board.move(dragger.piece, move)
-                    board.set_true_en_passant(dragger.piece)
                     gui.play_sound(captured)
-                    gui.show_bg(self.screen)
-                    gui.show_last_move(self.screen)
-                    gui.show_pieces(self.screen)
                     gui.next_turn()  # Ensure the turn is updated after your move
 
             dragger.undrag_piece()
+            self.renderer.invalidate()
 
         # After processing the player move, check if it's AI's turn
         if not dragger.dragging and gui.turn == self.ai.color:
-            start = time.time()
-            self.ai_move(gui, board, dragger, event)  # AI move should consider the latest board state
-            end = time.time()
-            print(end - start)
-
-    def ai_move(self, gui, board, dragger, event):
-        ai_move = self.ai.find_best_move(deepcopy(board))
-        if ai_move:
+            if self.ponder_move is not None:
+                self.resolve_ponder(board)
+            elif self.ai_thread is None:
+                self.start_ai(board)
+
+    def start_ai(self, board, ponder_move=None):
+        """
+        Starts searching a snapshot of the board on a worker thread, the move arrives as an AI_MOVE_EVENT.
+        With a ponder_move the search is of the reply to that player move, without a time limit until
+        resolve_ponder finds the player made it.
+        """
+        self.search_id += 1
+        position = board.position.copy()
+        if ponder_move is not None:
+            position.make(ponder_move)
+        self.ponder_move = ponder_move
+        self.ponder_result = None
+        self.ai.clear_stop()
+        self.ai_thread = threading.Thread(target=self._ai_search,
+                                          args=(position, self.search_id, ponder_move is not None), daemon=True)
+        self.ai_thread.start()
+        self.renderer.invalidate()
+
+    def resolve_ponder(self, board):
+        """ The player has moved: the ponder search carries on if it expected that move, or starts afresh """
+        if board.last_move() != self.ponder_move:
+            # the transposition table and history the ponder search filled are kept for the new search
+            self.cancel_ai()
+            self.start_ai(board)
+            return
+        self.ponder_move = None
+        if self.ai_thread is None:
+            pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, move=self.ponder_result, search_id=self.search_id))
+        else:
+            self.ai.ponderhit()
+        self.renderer.invalidate()
+
+    def cancel_ai(self):
+        self.ponder_move = None
+        self.ponder_result = None
+        if self.ai_thread is not None:
+            self.search_id += 1
+            self.ai.stop()
+            self.ai_thread.join()
+            self.ai_thread = None
+            self.renderer.invalidate()
+
+    def _ai_search(self, position, search_id, ponder=False):
+        move = None if ponder else self.ai.book_move(position)
+        if move is None:
+            move = self.ai.search(position, movetime=AI_MOVE_TIME, ponder=ponder)
+        pygame.event.post(pygame.event.Event(AI_MOVE_EVENT, move=move, search_id=search_id))
+
+    def ai_move(self, gui, board, event):
+        if event.search_id != self.search_id:
+            return
+        self.ai_thread = None
+        self.renderer.invalidate()
+        if self.ponder_move is not None:
+            # the ponder search ended before the player moved, its move waits for a ponder hit
+            self.ponder_result = event.move
+            return
+        if event.move is not None:
+            # the player move the AI expects after this one, from the principal variation (none after a book move)
+            expected = self.ai.pv[1:2] if self.ai.pv[:1] == [event.move] else []
+            ai_move = board.view_move(event.move)
             ai_move_initial = ai_move.initial
             ai_move_final = ai_move.final
             if board.squares[ai_move_initial.row][ai_move_initial.col].has_piece():
@@ -91,10 +169,9 @@ class Main:
                     captured = normal_capture or en_passant_capture
                     board.move(piece, ai_move)
                     gui.play_sound(captured)
-                    gui.show_bg(self.screen)
-                    gui.show_last_move(self.screen)
-                    gui.show_pieces(self.screen)
                     gui.next_turn()
+                    if PONDER and expected and not board.game_over():
+                        self.start_ai(board, expected[0])
         else:
             pygame.quit()
             sys.exit()
@@ -104,6 +181,7 @@ class Main:
         gui = self.gui
         board = self.gui.board
         dragger = self.gui.dragger
+        clock = pygame.time.Clock()
         while True:
             for event in pygame.event.get():
                 if event.type == pygame.MOUSEBUTTONDOWN:
@@ -112,30 +190,33 @@ class Main:
                     self.mouse_motion(gui, dragger, event)
                 elif event.type == pygame.MOUSEBUTTONUP:
                     self.mouse_up(gui, board, dragger, event)
+                elif event.type == AI_MOVE_EVENT:
+                    self.ai_move(gui, board, event)
+                elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+                    self.renderer.invalidate()
                 elif event.type == pygame.KEYDOWN:
+                    self.renderer.invalidate()
                     if event.key == pygame.K_u:
+                        self.cancel_ai()
                         if board.undo_move():
                             gui.next_turn()
                     if event.key == pygame.K_t:
                         gui.change_theme()
                     if event.key == pygame.K_r:
+                        self.cancel_ai()
                         gui.reset()
                         screen = self.screen
                         gui = self.gui
                         board = self.gui.board
                         dragger = self.gui.dragger
                 elif event.type == pygame.QUIT:
+                    self.cancel_ai()
                     pygame.quit()
                     sys.exit()
 
-            gui.show_bg(self.screen)
-            gui.show_last_move(self.screen)
-            gui.show_moves(self.screen)
-            gui.show_pieces(self.screen)
-            gui.show_hover(self.screen)
-            if dragger.dragging:
-                dragger.update_blit(screen)
-            pygame.display.flip()
+            thinking = self.ai_thread is not None and self.ponder_move is None
+            self.renderer.flush(screen, lambda surface: gui.show_all(surface, thinking))
+            clock.tick(FPS)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,47 @@
+import sys
+from position import WHITE
+from polyglot import polyglot_key, encode_move
+from book import ENTRY
+from pgn import read_games
+
+# Book moves are only taken from the first MAX_PLY plies of every game
+MAX_PLY = 24
+# Points a move earns for the side that played it, by game result (unfinished games count as draws)
+RESULT_POINTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1), "*": (1, 1)}
+MAX_WEIGHT = 0xFFFF
+
+def build(games, max_ply=MAX_PLY, min_games=1):
+    """ Sorted (key, move, weight) book entries for the Games, weighting moves by 2 per win and 1 per draw """
+    points = {}
+    played = {}
+    for game in games:
+        for ply, (position, move) in enumerate(game.replay()):
+            if ply == max_ply:
+                break
+            entry = (polyglot_key(position), encode_move(position, move))
+            points[entry] = points.get(entry, 0) + RESULT_POINTS[game.result][0 if position.side == WHITE else 1]
+            played[entry] = played.get(entry, 0) + 1
+    entries = [(key, move, weight) for (key, move), weight in points.items()
+               if weight and played[(key, move)] >= min_games]
+    scale = max([weight for key, move, weight in entries] + [MAX_WEIGHT]) / MAX_WEIGHT
+    # within a position the heaviest move comes first, like other book tools write them
+    entries.sort(key=lambda entry: (entry[0], -entry[2]))
+    return [(key, move, max(1, int(weight / scale))) for key, move, weight in entries]
+
+
+def write_book(path, entries):
+    with open(path, "wb") as file:
+        for key, move, weight in entries:
+            file.write(ENTRY.pack(key, move, weight, 0))
+
+
+if __name__ == '__main__':
+    # python makebook.py <games.pgn> <book.bin> [max ply] [min games]
+    args = sys.argv[1:]
+    if len(args) < 2:
+        sys.exit("usage: python makebook.py <games.pgn> <book.bin> [max ply] [min games]")
+    with open(args[0], "rb") as pgn:
+        entries = build(read_games(pgn), int(args[2]) if len(args) > 2 else MAX_PLY,
+                        int(args[3]) if len(args) > 3 else 1)
+    write_book(args[1], entries)
+    print(f"{len(entries)} entries written to {args[1]}")
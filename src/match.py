@@ -0,0 +1,319 @@
+import argparse
+import math
+import multiprocessing
+import sys
+import time
+from ai import ChessAI
+from book import OpeningBook
+from tablebase import Tablebases
+from position import Position, START_FEN, WHITE, BLACK, KNIGHT, BISHOP
+from pgn import write_game
+from analysis import read_fens
+
+# Adjudication defaults. Games are drawn after MAX_PLIES plies; they are won once both engines' scores
+# (white relative) have been past RESIGN_SCORE for RESIGN_PLIES plies in a row, and drawn once they have
+# stayed within DRAW_SCORE of zero for DRAW_PLIES plies after the first DRAW_START plies.
+MAX_PLIES = 400
+RESIGN_SCORE = 1000
+RESIGN_PLIES = 6
+DRAW_SCORE = 10
+DRAW_PLIES = 16
+DRAW_START = 80
+# Game endings that were called by the runner rather than reached on the board
+ADJUDICATED = ("move limit", "resign score", "draw score")
+# Quantile of the normal distribution for the 95% Elo error bars
+Z_95 = 1.959964
+
+# ChessAI instances of a pool worker by EngineConfig, kept between games
+_engines = {}
+
+
+class EngineConfig:
+    """
+    A ChessAI setup to play matches with: limits passed to ChessAI.search and attributes set on the ChessAI.
+    Parsed from text such as "depth=3" or "movetime=100,quiescence=0,hash=64"; `book` and `tablebases` take
+    paths and `hash` is the transposition table size in MB.
+    """
+
+    LIMITS = ("depth", "movetime", "nodes")
+
+    def __init__(self, name, limits=None, options=None):
+        self.name = name
+        self.limits = limits or {}
+        self.options = options or {}
+
+    @classmethod
+    def parse(cls, text, name=None):
+        limits, options = {}, {}
+        for item in filter(None, text.split(",")):
+            key, value = item.split("=", 1)
+            for kind in (int, float):
+                try:
+                    value = kind(value)
+                    break
+                except ValueError:
+                    pass
+            (limits if key in cls.LIMITS else options)[key] = value
+        return cls(name or text, limits, options)
+
+    def build(self):
+        options = dict(self.options)
+        ai = ChessAI("white", options.pop("hash", 16))
+        for key, value in options.items():
+            if key == "book":
+                ai.book = OpeningBook(value, randomize=True)
+            elif key == "tablebases":
+                ai.tablebases = Tablebases(value)
+            elif hasattr(ai, key):
+                setattr(ai, key, value)
+            else:
+                raise ValueError(f"ChessAI has no setting {key!r}")
+        return ai
+
+    def key(self):
+        return self.name, tuple(sorted(self.limits.items())), tuple(sorted(self.options.items()))
+
+
+class Adjudication:
+    """ When the runner ends a game that is not over on the board, see the defaults above """
+
+    def __init__(self, max_plies=MAX_PLIES, resign_score=RESIGN_SCORE, resign_plies=RESIGN_PLIES,
+                 draw_score=DRAW_SCORE, draw_plies=DRAW_PLIES, draw_start=DRAW_START):
+        self.max_plies = max_plies
+        self.resign_score = resign_score
+        self.resign_plies = resign_plies
+        self.draw_score = draw_score
+        self.draw_plies = draw_plies
+        self.draw_start = draw_start
+
+    def judge(self, scores):
+        """ (result, reason) for the game so far given the score of every move, None for book moves """
+        if len(scores) >= self.max_plies:
+            return "1/2-1/2", "move limit"
+        recent = scores[-self.resign_plies:]
+        if len(recent) == self.resign_plies and None not in recent:
+            if min(recent) >= self.resign_score:
+                return "1-0", "resign score"
+            if max(recent) <= -self.resign_score:
+                return "0-1", "resign score"
+        recent = scores[-self.draw_plies:]
+        if len(scores) >= self.draw_start and None not in recent and all(abs(s) <= self.draw_score for s in recent):
+            return "1/2-1/2", "draw score"
+        return None
+
+
+def game_over(position):
+    """ (result, reason) when the game has ended on the board """
+    if position.is_repetition(2):
+        return "1/2-1/2", "threefold repetition"
+    if not position.has_legal_move():
+        if position.in_check():
+            return ("0-1" if position.side == WHITE else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if position.halfmove >= 100:
+        return "1/2-1/2", "fifty-move rule"
+    if position.piece_count == 2 or (position.piece_count == 3 and any(
+            abs(code) in (KNIGHT, BISHOP) for code in position.squares)):
+        return "1/2-1/2", "insufficient material"
+    return None
+
+
+def _engine(config):
+    ai = _engines.get(config.key())
+    if ai is None:
+        ai = _engines[config.key()] = config.build()
+    return ai
+
+
+def play_game(task):
+    """ Pool task: plays game `index` from `fen`, returning (index, moves, result, reason) """
+    index, fen, white, black, adjudication = task
+    position = Position(fen)
+    players = {WHITE: (white, _engine(white)), BLACK: (black, _engine(black))}
+    for config, ai in players.values():
+        ai.tt.clear()
+        ai.history = [[0] * 64 for code in range(13)]
+    moves = []
+    scores = []
+    while True:
+        ending = game_over(position) or adjudication.judge(scores)
+        if ending is not None:
+            return (index, moves) + ending
+        config, ai = players[position.side]
+        move = ai.book_move(position)
+        if move is None:
+            move = ai.search(position, **config.limits)
+            scores.append(ai.score)
+        else:
+            scores.append(None)
+        position.make(move)
+        moves.append(move)
+
+
+def load_openings(path):
+    """ FEN strings from a file of FEN or EPD lines; blank lines and lines starting with # are skipped """
+    with open(path) as file:
+        return [Position(fen).fen() for fen in read_fens(file)]
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_difference(score):
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+def _score_stats(wins, draws, losses):
+    games = wins + draws + losses
+    if not games:
+        return 0, 0.5, 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    return games, score, variance
+
+
+def elo_estimate(wins, draws, losses):
+    """
+    Elo difference and the half width of its 95% confidence interval, from the trinomial results; no games
+    give 0 with an infinite error
+    """
+    games, score, variance = _score_stats(wins, draws, losses)
+    if not games:
+        return 0.0, math.inf
+    error = Z_95 * math.sqrt(variance / games)
+    low, high = elo_difference(score - error), elo_difference(score + error)
+    return elo_difference(score), (high - low) / 2
+
+
+def sprt_bounds(alpha=0.05, beta=0.05):
+    """ Log likelihood ratio below which H0 is accepted and above which H1 is """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """ Log likelihood ratio of H1 (Elo difference elo1) against H0 (elo0), in the normal approximation """
+    games, score, variance = _score_stats(wins, draws, losses)
+    if not variance:
+        return 0.0
+    score0, score1 = expected_score(elo0), expected_score(elo1)
+    return games * (score1 - score0) * (2 * score - score0 - score1) / (2 * variance)
+
+
+class MatchResult:
+    """ Results of `first` against `second` so far, and why the match stopped """
+
+    def __init__(self, first, second, sprt=None):
+        self.first = first
+        self.second = second
+        # (elo0, elo1, alpha, beta) of the sequential probability ratio test, or None to play every game
+        self.sprt = sprt
+        self.wins = self.draws = self.losses = 0
+        self.reasons = {}
+        self.verdict = None
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, result, first_white, reason):
+        points = {"1-0": 1, "0-1": -1, "1/2-1/2": 0}[result] * (1 if first_white else -1)
+        if points > 0:
+            self.wins += 1
+        elif points < 0:
+            self.losses += 1
+        else:
+            self.draws += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        if self.sprt is not None:
+            elo0, elo1, alpha, beta = self.sprt
+            lower, upper = sprt_bounds(alpha, beta)
+            llr = self.llr()
+            if llr <= lower:
+                self.verdict = "H0 accepted"
+            elif llr >= upper:
+                self.verdict = "H1 accepted"
+
+    def llr(self):
+        return sprt_llr(self.wins, self.draws, self.losses, *self.sprt[:2])
+
+    def __str__(self):
+        elo, error = elo_estimate(self.wins, self.draws, self.losses)
+        text = (f"{self.first.name} vs {self.second.name}: {self.games} games +{self.wins} ={self.draws} "
+                f"-{self.losses}, elo {elo:.1f} +/- {error:.1f}")
+        if self.sprt is not None:
+            lower, upper = sprt_bounds(*self.sprt[2:])
+            text += f", llr {self.llr():.2f} ({lower:.2f}, {upper:.2f})"
+        if self.verdict:
+            text += f", {self.verdict}"
+        return text
+
+
+def run_match(first, second, openings=(START_FEN,), games=100, workers=None, adjudication=None, pgn_path=None,
+              sprt=None, on_game=None):
+    """
+    Plays `games` games between two EngineConfigs over a pool of worker processes. Every opening is played
+    twice with colours reversed, `first` taking white in the even games. Stops early once the SPRT given as
+    (elo0, elo1, alpha, beta) accepts either hypothesis. Finished games are appended to `pgn_path` and passed
+    to on_game(result, index, moves, reason). Returns the MatchResult.
+    """
+    adjudication = adjudication or Adjudication()
+    result = MatchResult(first, second, sprt)
+    tasks = []
+    for index in range(games):
+        fen = openings[index // 2 % len(openings)]
+        white, black = (first, second) if index % 2 == 0 else (second, first)
+        tasks.append((index, fen, white, black, adjudication))
+    pgn = open(pgn_path, "a") if pgn_path else None
+    try:
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            for index, moves, outcome, reason in pool.imap_unordered(play_game, tasks):
+                result.add(outcome, index % 2 == 0, reason)
+                if pgn is not None:
+                    fen, white, black = tasks[index][1:4]
+                    tags = {"Event": f"{first.name} vs {second.name}", "Date": time.strftime("%Y.%m.%d"),
+                            "Round": index + 1, "White": white.name, "Black": black.name,
+                            "Termination": "adjudication" if reason in ADJUDICATED else "normal"}
+                    write_game(pgn, tags, moves, outcome, fen)
+                    pgn.flush()
+                if on_game is not None:
+                    on_game(result, index, moves, reason)
+                if result.verdict:
+                    break
+    finally:
+        if pgn is not None:
+            pgn.close()
+    return result
+
+
+if __name__ == '__main__':
+    # python match.py <first engine> <second engine> [options], engines given like "depth=3,quiescence=0"
+    parser = argparse.ArgumentParser(description="Plays ChessAI configurations against each other")
+    parser.add_argument("first")
+    parser.add_argument("second")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--openings", help="file of FEN or EPD positions, each played with both colours")
+    parser.add_argument("--pgn", help="file the games are appended to")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--sprt", type=float, nargs=2, metavar=("ELO0", "ELO1"))
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    args = parser.parse_args()
+
+    first = EngineConfig.parse(args.first)
+    second = EngineConfig.parse(args.second)
+    if first.name == second.name:
+        first.name, second.name = first.name + " (1)", second.name + " (2)"
+    openings = load_openings(args.openings) if args.openings else [START_FEN]
+    if not openings:
+        sys.exit(f"no positions in {args.openings}")
+    sprt = (*args.sprt, args.alpha, args.beta) if args.sprt else None
+    result = run_match(first, second, openings, args.games, args.workers, Adjudication(args.max_plies),
+                       args.pgn, sprt, on_game=lambda result, index, moves, reason: print(result, flush=True))
+    print(f"final: {result}")
+    print(", ".join(f"{reason} {count}" for reason, count in sorted(result.reasons.items())))
@@ -1,4 +1,6 @@
 class Move:
+    __slots__ = ("initial", "final", "piece_moved", "piece_taken", "promotion", "en_passant", "en_passant_row",
+                 "en_passant_col", "castle")
 
     def __init__(self, initial, final, piece_moved=None, piece_taken=None, en_passant_row=None, en_passant_col=None,promotion=False, en_passant=False, castle=False):
         self.initial = initial
@@ -0,0 +1,59 @@
+from position import PIECE_VALUES, PAWN, FLAG_SHIFT, EN_PASSANT_FLAG
+
+# Sort keys of the capture stage: most valuable victim first, then least valuable attacker
+VICTIM_WEIGHT = 10
+
+
+class MovePicker:
+    """
+    Yields the legal moves of a position in stages: the hash move, captures and promotions by MVV-LVA,
+    the killer moves of this ply, then the remaining quiet moves by history score. Each stage is generated
+    only once the previous one is exhausted, so a cutoff early on skips generating the rest. With
+    quiets=False only the captures and promotions are produced.
+    """
+
+    def __init__(self, position, hash_move=None, killers=(), history=None, quiets=True):
+        self.position = position
+        self.hash_move = hash_move
+        self.killers = killers
+        self.history = history
+        self.quiets = quiets
+
+    def __iter__(self):
+        position = self.position
+        info = position.check_info()
+        hash_move = self.hash_move
+        if hash_move and position.is_pseudo_legal(hash_move) and position.is_legal(hash_move, info):
+            yield hash_move
+
+        captures = position.pseudo_moves(captures=True, quiets=False)
+        captures.sort(key=self._mvv_lva, reverse=True)
+        for move in captures:
+            if move != hash_move and position.is_legal(move, info):
+                yield move
+
+        if not self.quiets:
+            return
+        killers = []
+        for killer in self.killers:
+            if (killer and killer != hash_move and not (killer >> 12) & 7 and not position.is_capture(killer)
+                    and position.is_pseudo_legal(killer) and position.is_legal(killer, info)):
+                killers.append(killer)
+                yield killer
+
+        quiets = position.pseudo_moves(captures=False, quiets=True)
+        if self.history is not None:
+            squares = position.squares
+            history = self.history
+            quiets.sort(key=lambda move: history[squares[move & 63]][(move >> 6) & 63], reverse=True)
+        for move in quiets:
+            if move != hash_move and move not in killers and position.is_legal(move, info):
+                yield move
+
+    def _mvv_lva(self, move):
+        squares = self.position.squares
+        to = (move >> 6) & 63
+        victim = abs(squares[to])
+        if move >> FLAG_SHIFT == EN_PASSANT_FLAG:
+            victim = PAWN
+        return PIECE_VALUES[victim] * VICTIM_WEIGHT + PIECE_VALUES[(move >> 12) & 7] - abs(squares[move & 63])
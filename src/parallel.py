@@ -0,0 +1,201 @@
+import math
+import multiprocessing
+from ai import ChessAI, SearchStopped
+from movepick import MovePicker
+from position import Position, UNDO_MOVE
+from tablebase import Tablebases
+
+# Stands in for an infinite bound in the shared integer holding the best root score
+SCORE_LIMIT = 1 << 30
+
+# State of a pool worker process, set up once by _init_worker
+_worker = None
+
+
+class _WorkerAI(ChessAI):
+    """
+    ChessAI living in a pool process, which also stops when the parent raises the shared stop event. Its node
+    limit is for the whole search: nodes are added to the count all workers share whenever limits are checked.
+    """
+
+    def __init__(self, tt_size_mb, shared_best, shared_nodes, stop_event):
+        super().__init__("white", tt_size_mb)
+        self.shared_best = shared_best
+        self.shared_nodes = shared_nodes
+        self.stop_event = stop_event
+        # nodes of the current task already added to shared_nodes
+        self.counted = 0
+        # ((fen, moves), position) of the last root searched, which every move of an iteration shares
+        self.root = None
+
+    def count_nodes(self):
+        """ Adds the nodes searched since the last call to the shared count, returning the new total """
+        with self.shared_nodes.get_lock():
+            self.shared_nodes.value += self.nodes - self.counted
+            total = self.shared_nodes.value
+        self.counted = self.nodes
+        return total
+
+    def _check_limits(self):
+        if self.stop_event.is_set():
+            raise SearchStopped
+        total = self.count_nodes()
+        if self.node_limit is not None and total >= self.node_limit:
+            raise SearchStopped
+        super()._check_limits()
+
+
+def _init_worker(tt_size_mb, shared_best, shared_nodes, stop_event, tablebase_dir):
+    global _worker
+    _worker = _WorkerAI(tt_size_mb, shared_best, shared_nodes, stop_event)
+    if tablebase_dir is not None:
+        _worker.tablebases = Tablebases(tablebase_dir)
+
+
+def _root_position(root):
+    """ The worker's Position for a root given as (FEN, moves), rebuilt only when the root changes """
+    ai = _worker
+    if ai.root is None or ai.root[0] != root:
+        fen, moves = root
+        position = Position(fen)
+        for move in moves:
+            position.make(move)
+        ai.root = root, position
+        ai.tt.new_search()
+    return ai.root[1]
+
+
+def _search_move(root, move, depth, hard_deadline, node_limit):
+    """
+    Searches one root move with the best root score found so far as the bound, scores being for the side to
+    move at the root: with a null window at the bound, and again with the window open above it when the move
+    beats it. `node_limit` counts the nodes of every task of the search. Returns (move, score, bound used,
+    nodes), with score None if the search was stopped.
+    """
+    ai = _worker
+    position = _root_position(root)
+    ai.stopped = False
+    ai.nodes = 0
+    ai.counted = 0
+    ai.hard_deadline = hard_deadline
+    ai.node_limit = node_limit
+    ai.root_ply = position.ply
+    bound = ai.shared_best.value
+    # limits are only checked every CHECK_INTERVAL nodes, so a task queued behind the stop must not start
+    if ai.stop_event.is_set() or (node_limit is not None and ai.shared_nodes.value >= node_limit):
+        return move, None, bound, 0
+    position.make(move)
+    try:
+        if bound > -SCORE_LIMIT:
+            score = -ai.negamax(position, depth - 1, -bound - 1, -bound)
+            if score > bound:
+                score = -ai.negamax(position, depth - 1, -math.inf, -bound)
+        else:
+            score = -ai.negamax(position, depth - 1, -math.inf, math.inf)
+    except SearchStopped:
+        while position.ply > ai.root_ply:
+            position.unmake()
+        ai.count_nodes()
+        return move, None, bound, ai.nodes
+    position.unmake()
+    ai.count_nodes()
+    with ai.shared_best.get_lock():
+        if score > ai.shared_best.value:
+            ai.shared_best.value = score
+    return move, score, bound, ai.nodes
+
+
+class ParallelChessAI(ChessAI):
+    """
+    ChessAI that splits every iteration's root moves over a pool of worker processes. The best move of
+    the previous iteration is searched first to set a bound, the rest are then searched in parallel with a
+    null window at the best score so far, shared through a multiprocessing.Value. Each worker keeps its own
+    transposition table, killers and history between tasks. The node limit is for the whole search, the
+    workers counting their nodes in another shared Value, and may be passed by up to CHECK_INTERVAL nodes
+    per worker.
+    """
+
+    def __init__(self, color, tt_size_mb=16, workers=None):
+        super().__init__(color, tt_size_mb)
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pool = None
+        self._context = multiprocessing.get_context("spawn")
+        self._shared_best = self._context.Value("q", -SCORE_LIMIT)
+        self._shared_nodes = self._context.Value("q", 0)
+        self._stop_event = self._context.Event()
+
+    def stop(self):
+        super().stop()
+        self._stop_event.set()
+
+    def clear_stop(self):
+        super().clear_stop()
+        self._stop_event.clear()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def search(self, position, **limits):
+        if self.pool is None:
+            tablebase_dir = self.tablebases.directory if self.tablebases is not None else None
+            self.pool = self._context.Pool(self.workers, _init_worker, (self.tt.size_mb, self._shared_best,
+                                                                        self._shared_nodes, self._stop_event,
+                                                                        tablebase_dir))
+        self._shared_nodes.value = 0
+        try:
+            return super().search(position, **limits)
+        finally:
+            # workers are also stopped when one of them runs out of time, which must not outlast this search
+            if not self.stopped:
+                self._stop_event.clear()
+
+    def _search_root(self, position, depth):
+        moves = list(MovePicker(position, self.pv[0] if self.pv else None))
+        root = _root(position)
+        args = [(root, move, depth, self.hard_deadline, self.node_limit) for move in moves]
+        self._shared_best.value = -SCORE_LIMIT
+
+        first = self.pool.apply(_search_move, args[0])
+        results = [first]
+        if first[1] is not None:
+            for result in self.pool.imap_unordered(_unpack_search_move, args[1:]):
+                results.append(result)
+                if result[1] is None:
+                    # one worker ran out of time or was stopped, abort the others too
+                    self._stop_event.set()
+
+        best_move, best_score = None, None
+        for move, score, bound, nodes in results:
+            self.nodes += nodes
+            if score is None:
+                continue
+            # scores that did not beat the bound they were searched with are only upper bounds
+            if best_move is None or score > max(bound, best_score):
+                best_move, best_score = move, score
+        if self.stopped or any(score is None for move, score, bound, nodes in results):
+            raise SearchStopped
+        # the workers keep their lines, so the principal variation is the root move alone
+        return [best_move], best_score
+
+
+def _root(position):
+    """
+    FEN and moves that rebuild `position` for the workers, the moves going back to the last capture or pawn
+    move so that repetitions are still found. Far smaller to send than the Position and its undo stack.
+    """
+    moves = []
+    for back in range(min(position.halfmove, position.ply)):
+        moves.append(position.stack[position.ply - 1][UNDO_MOVE])
+        position.unmake()
+    fen = position.fen()
+    moves.reverse()
+    for move in moves:
+        position.make(move)
+    return fen, tuple(moves)
+
+
+def _unpack_search_move(args):
+    return _search_move(*args)
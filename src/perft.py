@@ -0,0 +1,69 @@
+import sys
+import time
+from position import Position, START_FEN, move_name
+
+# Reference positions with their known leaf counts from depth 1 upwards
+PERFT_SUITE = [
+    ("start", START_FEN, (20, 400, 8902, 197281, 4865609)),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", (48, 2039, 97862, 4085603)),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", (14, 191, 2812, 43238, 674624)),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", (6, 264, 9467, 422333)),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", (44, 1486, 62379, 2103487)),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     (46, 2079, 89890, 3894594)),
+]
+
+
+def perft(position, depth):
+    """ Number of leaf nodes of the legal move tree `depth` plies deep """
+    moves = position.legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1
+    nodes = 0
+    for move in moves:
+        position.make(move)
+        nodes += perft(position, depth - 1)
+        position.unmake()
+    return nodes
+
+
+def divide(position, depth):
+    """ Perft count below every root move, keyed by move name """
+    counts = {}
+    for move in position.legal_moves():
+        position.make(move)
+        counts[move_name(move)] = perft(position, depth - 1)
+        position.unmake()
+    return counts
+
+
+def run_suite(max_depth=3):
+    """ Checks every suite position up to max_depth, printing counts and nodes per second. Returns success """
+    ok = True
+    for name, fen, expected in PERFT_SUITE:
+        for depth, count in enumerate(expected[:max_depth], 1):
+            start = time.time()
+            nodes = perft(Position(fen), depth)
+            elapsed = time.time() - start
+            status = "ok" if nodes == count else f"FAIL (expected {count})"
+            ok = ok and nodes == count
+            print(f"{name:<12} depth {depth} {nodes:>10} {elapsed:>8.2f}s {nodes / max(elapsed, 1e-9):>10.0f} nps  {status}")
+    return ok
+
+
+if __name__ == '__main__':
+    # python perft.py suite [max depth] | python perft.py divide <depth> [fen] | python perft.py <depth> [fen]
+    args = sys.argv[1:]
+    if not args or args[0] == "suite":
+        sys.exit(0 if run_suite(int(args[1]) if len(args) > 1 else 3) else 1)
+    elif args[0] == "divide":
+        counts = divide(Position(" ".join(args[2:]) or START_FEN), int(args[1]))
+        for move, count in sorted(counts.items()):
+            print(f"{move}: {count}")
+        print(f"\nmoves: {len(counts)}  nodes: {sum(counts.values())}")
+    else:
+        position = Position(" ".join(args[1:]) or START_FEN)
+        start = time.time()
+        nodes = perft(position, int(args[0]))
+        elapsed = time.time() - start
+        print(f"nodes: {nodes}  time: {elapsed:.2f}s  nps: {nodes / max(elapsed, 1e-9):.0f}")
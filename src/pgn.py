@@ -0,0 +1,225 @@
+import io
+import multiprocessing
+import os
+import re
+import sys
+from position import Position, START_FEN, WHITE
+
+# Tags every PGN game starts with, in this order
+SEVEN_TAG_ROSTER = ("Event", "Site", "Date", "Round", "White", "Black", "Result")
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+LINE_LENGTH = 79
+# Byte ranges handed to each worker by map_games, more than one so that slow ranges even out
+RANGES_PER_WORKER = 8
+
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Comments, variations, NAGs and move numbers: everything in movetext that is not a move or a result
+_NOISE = re.compile(r"\{[^}]*\}|;[^\n]*|\([^()]*\)|\$\d+|\d+\.(\.\.)?")
+# Seven tag roster games open with the Event tag, which is where byte ranges are cut (after a blank line)
+_GAME_START = b"[Event "
+
+
+class Game:
+    """ A game read from PGN: its tags, its moves in SAN and its result """
+
+    def __init__(self, tags=None, moves=None, result="*"):
+        self.tags = tags or {}
+        self.moves = moves or []
+        self.result = result
+
+    @property
+    def fen(self):
+        return self.tags.get("FEN", START_FEN)
+
+    def replay(self):
+        """
+        Yields (position, move) for every move, with the move not yet made on the position, which is one
+        Position updated in place. Stops early at a move that is not legal.
+        """
+        position = Position(self.fen)
+        for san in self.moves:
+            move = position.parse_san(san)
+            if move is None:
+                return
+            yield position, move
+            position.make(move)
+
+    def __repr__(self):
+        players = f"{self.tags.get('White', '?')} - {self.tags.get('Black', '?')}"
+        return f"Game({players}, {len(self.moves)} plies, {self.result})"
+
+
+def read_games(file, start=0, end=None):
+    """
+    Generator of the Games in a PGN file opened in binary mode, read a line at a time so any size of file
+    takes constant memory. With a byte range, only games whose first tag line starts in [start, end) are read,
+    and `start` has to be the start of a line.
+    """
+    file.seek(start)
+    tags = {}
+    movetext = []
+    # brace comments can run over several lines, and those lines may start with anything
+    in_comment = False
+    while True:
+        offset = file.tell() if end is not None else 0
+        line = file.readline()
+        if not line:
+            break
+        line = line.decode("utf-8", errors="replace").strip()
+        if line.startswith("[") and not in_comment:
+            if movetext:
+                yield _game(tags, movetext)
+                tags, movetext = {}, []
+            if not tags and end is not None and offset >= end:
+                return
+            match = _TAG.match(line)
+            if match:
+                tags[match.group(1)] = re.sub(r"\\(.)", r"\1", match.group(2))
+        elif line and not line.startswith("%"):
+            movetext.append(line)
+            in_comment = _in_comment(line, in_comment)
+    if tags or movetext:
+        yield _game(tags, movetext)
+
+
+def _in_comment(line, in_comment):
+    """ Whether a brace comment is still open after `line`; braces after a ; comment do not count """
+    for char in line:
+        if in_comment:
+            in_comment = char != "}"
+        elif char == "{":
+            in_comment = True
+        elif char == ";":
+            break
+    return in_comment
+
+
+def read_game(text):
+    """ The first Game in PGN text, or None """
+    return next(read_games(io.BytesIO(text.encode())), None)
+
+
+def _game(tags, movetext):
+    # lines stay apart so that a ; comment only runs to the end of its own line
+    text = "\n".join(movetext)
+    # variations nest, so strip them innermost first
+    previous = None
+    while previous != text:
+        previous, text = text, _NOISE.sub(" ", text)
+    result = tags.get("Result", "*")
+    moves = []
+    for token in text.split():
+        if token in RESULTS:
+            result = token
+        else:
+            moves.append(token)
+    return Game(tags, moves, result)
+
+
+def split_ranges(path, parts):
+    """ Up to `parts` byte ranges (start, end) of a PGN file that each begin at a game, together covering it """
+    size = os.path.getsize(path)
+    starts = [0]
+    with open(path, "rb") as file:
+        for part in range(1, parts):
+            offset = _next_game(file, max(size * part // parts, starts[-1] + 1))
+            if offset >= size:
+                break
+            if offset > starts[-1]:
+                starts.append(offset)
+    return list(zip(starts, starts[1:] + [size]))
+
+
+def _next_game(file, offset):
+    """ Offset of the first game starting on a line at or after `offset`, or the end of the file """
+    file.seek(offset - 1)
+    # step to the next line start unless `offset` is one already
+    if file.read(1) != b"\n":
+        file.readline()
+    # games are separated by a blank line, which tells them apart from comment lines that look like tags
+    blank = False
+    while True:
+        offset = file.tell()
+        line = file.readline()
+        if not line or (blank and line.startswith(_GAME_START)):
+            return offset
+        blank = not line.strip()
+
+
+def _map_range(task):
+    path, start, end, function = task
+    with open(path, "rb") as file:
+        return [function(game) for game in read_games(file, start, end)]
+
+
+def map_games(path, function, workers=None):
+    """
+    Yields function(game) for every game of a PGN file, the file split into byte ranges that a pool of worker
+    processes reads in parallel. `function` has to be picklable (defined at module level). Results come
+    back a range at a time, in no particular order.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    tasks = [(path, start, end, function) for start, end in split_ranges(path, workers * RANGES_PER_WORKER)]
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        for results in pool.imap_unordered(_map_range, tasks):
+            yield from results
+
+
+def format_game(tags, moves, result="*", fen=START_FEN):
+    """
+    PGN text of a game played from `fen`: `tags` (a dict, the roster filled in with "?"), then the legal
+    `moves` in SAN with movetext wrapped at LINE_LENGTH
+    """
+    tags = dict(tags, Result=result)
+    if fen != START_FEN:
+        tags.update(SetUp="1", FEN=fen)
+    names = list(SEVEN_TAG_ROSTER) + [name for name in tags if name not in SEVEN_TAG_ROSTER]
+    lines = [f'[{name} "{_escape(tags.get(name, "?"))}"]' for name in names]
+    lines.append("")
+
+    position = Position(fen)
+    number = position.fullmove
+    tokens = []
+    for move in moves:
+        if position.side == WHITE:
+            tokens.append(f"{number}.")
+        else:
+            if not tokens:
+                tokens.append(f"{number}...")
+            number += 1
+        tokens.append(position.san(move))
+        position.make(move)
+    tokens.append(result)
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > LINE_LENGTH:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def write_game(file, tags, moves, result="*", fen=START_FEN):
+    file.write(format_game(tags, moves, result, fen))
+
+
+def _count(game):
+    return len(game.moves)
+
+
+if __name__ == '__main__':
+    # python pgn.py <games.pgn> [workers]: counts the games and plies of a file, reading it in parallel
+    args = sys.argv[1:]
+    if not args:
+        sys.exit("usage: python pgn.py <games.pgn> [workers]")
+    games = plies = 0
+    for count in map_games(args[0], _count, int(args[1]) if len(args) > 1 else None):
+        games += 1
+        plies += count
+    print(f"{games} games, {plies} plies")
@@ -0,0 +1,727 @@
+from const import *
+from zobrist import PIECE_KEYS, SIDE_KEY, CASTLING_KEYS, EP_KEYS
+from evaluation import PIECE_SQUARE, PHASE, taper
+from attacks import KNIGHT_TARGETS, KING_TARGETS, DIAGONAL_RAYS, ORTHOGONAL_RAYS, ALL_RAYS, PAWN_CAPTURES
+
+# Piece codes stored in the mailbox. White pieces are positive, black pieces negative.
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+
+# Side to move, also the sign of that side's piece codes
+WHITE = 1
+BLACK = -1
+
+# Castling rights bits
+WHITE_KINGSIDE = 1
+WHITE_QUEENSIDE = 2
+BLACK_KINGSIDE = 4
+BLACK_QUEENSIDE = 8
+
+NO_SQUARE = -1
+
+# Moves are ints: from | to << 6 | promotion << 12 | flag << 15. The flag marks the moves make() has to
+# treat specially, so it never needs to work them out from the board.
+FLAG_SHIFT = 15
+CASTLE_FLAG = 1
+EN_PASSANT_FLAG = 2
+DOUBLE_PUSH_FLAG = 3
+CASTLE = CASTLE_FLAG << FLAG_SHIFT
+EN_PASSANT = EN_PASSANT_FLAG << FLAG_SHIFT
+DOUBLE_PUSH = DOUBLE_PUSH_FLAG << FLAG_SHIFT
+# Recorded on the undo stack for a null move, a8 to a8 being no real move
+NULL_MOVE = 0
+
+# Undo stack: one reusable record per ply, preallocated for UNDO_PLIES plies and doubled when a game outgrows
+# it. A record holds the move and the state make() cannot recompute when taking it back, in UNDO_* order.
+(UNDO_MOVE, UNDO_CAPTURED, UNDO_CASTLING, UNDO_EP, UNDO_HALFMOVE, UNDO_MATERIAL, UNDO_HASH, UNDO_SCORE,
+ UNDO_PHASE) = range(9)
+UNDO_SIZE = 9
+UNDO_PLIES = 1024
+
+
+def _undo_records(count):
+    return [[0] * UNDO_SIZE for ply in range(count)]
+
+
+# Centipawn values indexed by piece type
+PIECE_VALUES = (0, 100, 300, 300, 500, 900, 0)
+# Values for static exchange evaluation, where the king is the last piece anyone wants to recapture with
+SEE_VALUES = (0, 100, 300, 300, 500, 900, 20000)
+
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FEN_PIECES = {"p": PAWN, "n": KNIGHT, "b": BISHOP, "r": ROOK, "q": QUEEN, "k": KING}
+PROMOTION_LETTERS = {KNIGHT: "n", BISHOP: "b", ROOK: "r", QUEEN: "q"}
+FEN_CASTLING = {"K": WHITE_KINGSIDE, "Q": WHITE_QUEENSIDE, "k": BLACK_KINGSIDE, "q": BLACK_QUEENSIDE}
+
+# Rights that survive a move touching the square (king or rook leaving/being captured)
+CASTLING_MASK = [15] * 64
+CASTLING_MASK[0] = 15 ^ BLACK_QUEENSIDE
+CASTLING_MASK[4] = 15 ^ (BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASK[7] = 15 ^ BLACK_KINGSIDE
+CASTLING_MASK[56] = 15 ^ WHITE_QUEENSIDE
+CASTLING_MASK[60] = 15 ^ (WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASK[63] = 15 ^ WHITE_KINGSIDE
+
+
+def square(row, col):
+    return row * COLS + col
+
+
+def encode_move(frm, to, promotion=0, flag=0):
+    return frm | (to << 6) | (promotion << 12) | (flag << FLAG_SHIFT)
+
+
+def move_from(move):
+    return move & 63
+
+
+def move_to(move):
+    return (move >> 6) & 63
+
+
+def move_promotion(move):
+    return (move >> 12) & 7
+
+
+def move_flag(move):
+    return move >> FLAG_SHIFT
+
+
+def move_name(move):
+    """ Coordinate notation such as e2e4 or a7a8q """
+    name = ""
+    for sq in (move & 63, (move >> 6) & 63):
+        name += "abcdefgh"[sq & 7] + str(ROWS - (sq >> 3))
+    return name + PROMOTION_LETTERS.get((move >> 12) & 7, "")
+
+
+class Position:
+    """ Compact position: a flat 64 entry mailbox indexed by row * 8 + col (row 0 is black's back rank) """
+
+    __slots__ = ("squares", "side", "castling", "ep", "halfmove", "material", "score", "phase", "king", "hash",
+                 "piece_count", "stack", "ply", "fullmove")
+
+    def __init__(self, fen=START_FEN):
+        self.squares = [EMPTY] * 64
+        self.side = WHITE
+        self.castling = 0
+        self.ep = NO_SQUARE
+        # plies since the last capture or pawn move
+        self.halfmove = 0
+        # material balance in centipawns, white minus black
+        self.material = 0
+        # packed middlegame/endgame piece-square score, white minus black, and the game phase
+        self.score = 0
+        self.phase = 0
+        # king squares indexed by side, so king[WHITE] and king[BLACK] (the last entry) both work
+        self.king = [NO_SQUARE, NO_SQUARE, NO_SQUARE]
+        # pieces on the board, kings included
+        self.piece_count = 0
+        # undo records, the first `ply` of them belong to the moves made since set_fen
+        self.stack = []
+        self.ply = 0
+        # FEN move number of the position set_fen was given
+        self.fullmove = 1
+        self.set_fen(fen)
+
+    def set_fen(self, fen):
+        fields = fen.split()
+        placement, side = fields[0], fields[1] if len(fields) > 1 else "w"
+        castling, ep = (fields[2], fields[3]) if len(fields) > 3 else ("-", "-")
+        self.squares = [EMPTY] * 64
+        self.material = 0
+        self.piece_count = 0
+        for row, rank in enumerate(placement.split("/")):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                    continue
+                code = FEN_PIECES[char.lower()] * (WHITE if char.isupper() else BLACK)
+                self.squares[square(row, col)] = code
+                self.material += PIECE_VALUES[abs(code)] * (WHITE if code > 0 else BLACK)
+                self.piece_count += 1
+                if abs(code) == KING:
+                    self.king[WHITE if code > 0 else BLACK] = square(row, col)
+                col += 1
+        self.side = WHITE if side == "w" else BLACK
+        self.castling = 0
+        for char in castling.replace("-", ""):
+            self.castling |= FEN_CASTLING[char]
+        self.ep = NO_SQUARE if ep == "-" else square(ROWS - int(ep[1]), ord(ep[0]) - ord("a"))
+        self.halfmove = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self.stack = _undo_records(UNDO_PLIES)
+        self.ply = 0
+        self.hash = self.compute_hash()
+        self.score, self.phase = self.compute_score()
+
+    def fen(self):
+        ranks = []
+        for row in range(ROWS):
+            rank, empty = "", 0
+            for code in self.squares[row * COLS:(row + 1) * COLS]:
+                if code == EMPTY:
+                    empty += 1
+                    continue
+                letter = "pnbrqk"[abs(code) - 1]
+                rank += (str(empty) if empty else "") + (letter.upper() if code > 0 else letter)
+                empty = 0
+            ranks.append(rank + (str(empty) if empty else ""))
+        castling = "".join(char for char, right in FEN_CASTLING.items() if self.castling & right) or "-"
+        ep = "-" if self.ep == NO_SQUARE else "abcdefgh"[self.ep & 7] + str(ROWS - (self.ep >> 3))
+        # the move number goes up after black's moves, the first of which may have been the first ply
+        started_black = (self.side == BLACK) == (self.ply % 2 == 0)
+        fullmove = self.fullmove + (self.ply + started_black) // 2
+        return (f"{'/'.join(ranks)} {'w' if self.side == WHITE else 'b'} {castling} {ep} {self.halfmove} "
+                f"{fullmove}")
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.squares = self.squares[:]
+        position.side = self.side
+        position.castling = self.castling
+        position.ep = self.ep
+        position.halfmove = self.halfmove
+        position.material = self.material
+        position.score = self.score
+        position.phase = self.phase
+        position.king = self.king[:]
+        position.hash = self.hash
+        position.piece_count = self.piece_count
+        position.stack = [record[:] for record in self.stack]
+        position.ply = self.ply
+        position.fullmove = self.fullmove
+        return position
+
+    def make(self, move):
+        squares = self.squares
+        side = self.side
+        frm = move & 63
+        to = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        flag = move >> FLAG_SHIFT
+        piece = squares[frm]
+        captured = squares[to]
+
+        stack = self.stack
+        if self.ply == len(stack):
+            stack.extend(_undo_records(len(stack)))
+        record = stack[self.ply]
+        record[0] = move
+        record[1] = captured
+        record[2] = self.castling
+        record[3] = self.ep
+        record[4] = self.halfmove
+        record[5] = self.material
+        record[6] = self.hash
+        record[7] = self.score
+        record[8] = self.phase
+        self.ply += 1
+
+        h = self.hash
+        if self.ep != NO_SQUARE:
+            h ^= self.ep_key()
+        squares[frm] = EMPTY
+        squares[to] = piece
+        h ^= SIDE_KEY ^ PIECE_KEYS[piece][frm] ^ PIECE_KEYS[piece][to]
+        score = self.score + PIECE_SQUARE[piece][to] - PIECE_SQUARE[piece][frm]
+        kind = piece * side
+        if captured or kind == PAWN:
+            self.halfmove = 0
+        else:
+            self.halfmove += 1
+        if captured:
+            self.material += PIECE_VALUES[-captured * side] * side
+            h ^= PIECE_KEYS[captured][to]
+            score -= PIECE_SQUARE[captured][to]
+            self.phase -= PHASE[captured]
+            self.piece_count -= 1
+        ep = NO_SQUARE
+        if flag == DOUBLE_PUSH_FLAG:
+            ep = (frm + to) >> 1
+            # keyed only when an enemy pawn could take, like ep_key
+            for sq in PAWN_CAPTURES[side][ep]:
+                if squares[sq] == -PAWN * side:
+                    h ^= EP_KEYS[ep]
+                    break
+        elif flag == EN_PASSANT_FLAG:
+            squares[to + 8 * side] = EMPTY
+            self.material += PIECE_VALUES[PAWN] * side
+            h ^= PIECE_KEYS[-piece][to + 8 * side]
+            score -= PIECE_SQUARE[-piece][to + 8 * side]
+            self.piece_count -= 1
+        elif flag == CASTLE_FLAG:
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            rook = squares[rook_from]
+            squares[rook_to] = rook
+            squares[rook_from] = EMPTY
+            h ^= PIECE_KEYS[rook][rook_from] ^ PIECE_KEYS[rook][rook_to]
+            score += PIECE_SQUARE[rook][rook_to] - PIECE_SQUARE[rook][rook_from]
+        if promotion:
+            squares[to] = promotion * side
+            self.material += (PIECE_VALUES[promotion] - PIECE_VALUES[PAWN]) * side
+            h ^= PIECE_KEYS[piece][to] ^ PIECE_KEYS[promotion * side][to]
+            score += PIECE_SQUARE[promotion * side][to] - PIECE_SQUARE[piece][to]
+            self.phase += PHASE[promotion]
+        elif kind == KING:
+            self.king[side] = to
+
+        castling = self.castling & CASTLING_MASK[frm] & CASTLING_MASK[to]
+        self.hash = h ^ CASTLING_KEYS[self.castling] ^ CASTLING_KEYS[castling]
+        self.score = score
+        self.castling = castling
+        self.ep = ep
+        self.side = -side
+
+    def unmake(self):
+        self.ply -= 1
+        (move, captured, self.castling, self.ep, self.halfmove, self.material, self.hash, self.score,
+         self.phase) = self.stack[self.ply]
+        if move == NULL_MOVE:
+            self.side = -self.side
+            return
+
+        squares = self.squares
+        side = -self.side
+        frm = move & 63
+        to = (move >> 6) & 63
+        flag = move >> FLAG_SHIFT
+        piece = squares[to]
+        if (move >> 12) & 7:
+            piece = PAWN * side
+        elif piece == KING * side:
+            self.king[side] = frm
+
+        squares[frm] = piece
+        squares[to] = captured
+        if captured:
+            self.piece_count += 1
+        if flag == EN_PASSANT_FLAG:
+            squares[to + 8 * side] = -PAWN * side
+            self.piece_count += 1
+        elif flag == CASTLE_FLAG:
+            rook_from, rook_to = (frm + 3, frm + 1) if to > frm else (frm - 4, frm - 1)
+            squares[rook_from] = squares[rook_to]
+            squares[rook_to] = EMPTY
+        self.side = side
+
+    def make_null(self):
+        """ Passes the turn to the other side, for null move pruning; taken back with unmake """
+        stack = self.stack
+        if self.ply == len(stack):
+            stack.extend(_undo_records(len(stack)))
+        record = stack[self.ply]
+        record[0] = NULL_MOVE
+        record[1] = EMPTY
+        record[2] = self.castling
+        record[3] = self.ep
+        record[4] = self.halfmove
+        record[5] = self.material
+        record[6] = self.hash
+        record[7] = self.score
+        record[8] = self.phase
+        self.ply += 1
+        self.hash ^= SIDE_KEY ^ self.ep_key()
+        self.ep = NO_SQUARE
+        self.halfmove += 1
+        self.side = -self.side
+
+    def is_repetition(self, times=1):
+        """
+        Whether the position occurred `times` times before, found from the hashes in the undo stack. Only the
+        positions since the last capture or pawn move can repeat it, so at most halfmove / 2 are looked at.
+        A null move ends the walk, as positions before it were not reached by moves.
+        """
+        stack = self.stack
+        h = self.hash
+        ply = self.ply
+        for past in range(ply - 2, max(ply - self.halfmove, 0) - 1, -2):
+            if stack[past + 1][UNDO_MOVE] == NULL_MOVE or stack[past][UNDO_MOVE] == NULL_MOVE:
+                return False
+            if stack[past][UNDO_HASH] == h:
+                times -= 1
+                if not times:
+                    return True
+        return False
+
+    def evaluate(self):
+        """ Tapered piece-square evaluation in centipawns from white's point of view, O(1) from the incremental terms """
+        return taper(self.score, self.phase)
+
+    def compute_score(self):
+        """ Packed piece-square score and game phase recomputed from the mailbox """
+        score = phase = 0
+        for sq in range(64):
+            score += PIECE_SQUARE[self.squares[sq]][sq]
+            phase += PHASE[self.squares[sq]]
+        return score, phase
+
+    def ep_key(self):
+        """
+        Zobrist key of the en passant square, zero unless a pawn of the side to move attacks it. A position
+        hashes the same whether or not it came from a double push nobody can take, so repetitions are found.
+        """
+        ep = self.ep
+        if ep != NO_SQUARE:
+            pawn = PAWN * self.side
+            for sq in PAWN_CAPTURES[-self.side][ep]:
+                if self.squares[sq] == pawn:
+                    return EP_KEYS[ep]
+        return 0
+
+    def compute_hash(self):
+        h = CASTLING_KEYS[self.castling] ^ self.ep_key()
+        if self.side == BLACK:
+            h ^= SIDE_KEY
+        for sq in range(64):
+            h ^= PIECE_KEYS[self.squares[sq]][sq]
+        return h
+
+    def attacked(self, sq, by):
+        """ Whether side `by` attacks the square `sq` """
+        squares = self.squares
+        # a pawn of `by` attacks sq from the squares a pawn of the other side on sq would attack
+        pawn = PAWN * by
+        for frm in PAWN_CAPTURES[-by][sq]:
+            if squares[frm] == pawn:
+                return True
+        knight = KNIGHT * by
+        for frm in KNIGHT_TARGETS[sq]:
+            if squares[frm] == knight:
+                return True
+        king = KING * by
+        for frm in KING_TARGETS[sq]:
+            if squares[frm] == king:
+                return True
+        queen = QUEEN * by
+        for rays, slider in ((DIAGONAL_RAYS[sq], BISHOP * by), (ORTHOGONAL_RAYS[sq], ROOK * by)):
+            for ray in rays:
+                for frm in ray:
+                    piece = squares[frm]
+                    if piece:
+                        if piece == slider or piece == queen:
+                            return True
+                        break
+        return False
+
+    def see(self, move):
+        """ Static exchange evaluation: material won by `move` if both sides keep recapturing on its square with their least valuable piece """
+        squares = self.squares[:]
+        side = self.side
+        frm = move & 63
+        to = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        piece = squares[frm]
+        gain = [SEE_VALUES[abs(squares[to])]]
+        if move >> FLAG_SHIFT == EN_PASSANT_FLAG:
+            squares[to + 8 * side] = EMPTY
+            gain[0] = SEE_VALUES[PAWN]
+        if promotion:
+            piece = promotion * side
+            gain[0] += SEE_VALUES[promotion] - SEE_VALUES[PAWN]
+        on_square = SEE_VALUES[piece * side]
+        squares[frm] = EMPTY
+        squares[to] = piece
+        side = -side
+        while True:
+            attacker = self._least_valuable_attacker(to, side, squares)
+            if attacker == NO_SQUARE:
+                break
+            gain.append(on_square - gain[-1])
+            piece = squares[attacker]
+            on_square = SEE_VALUES[piece * side]
+            squares[attacker] = EMPTY
+            squares[to] = piece
+            side = -side
+        # each side may stop recapturing when going on would lose material
+        while len(gain) > 1:
+            last = gain.pop()
+            gain[-1] = -max(-gain[-1], last)
+        return gain[0]
+
+    @staticmethod
+    def _least_valuable_attacker(sq, by, squares):
+        pawn = PAWN * by
+        for frm in PAWN_CAPTURES[-by][sq]:
+            if squares[frm] == pawn:
+                return frm
+        knight = KNIGHT * by
+        for frm in KNIGHT_TARGETS[sq]:
+            if squares[frm] == knight:
+                return frm
+        # first piece along each line, then pick the cheapest that attacks along it
+        best, best_kind = NO_SQUARE, KING + 1
+        for rays, slider in ((DIAGONAL_RAYS[sq], BISHOP), (ORTHOGONAL_RAYS[sq], ROOK)):
+            for ray in rays:
+                for frm in ray:
+                    piece = squares[frm] * by
+                    if piece:
+                        if (piece == slider or piece == QUEEN) and piece < best_kind:
+                            best, best_kind = frm, piece
+                        break
+        if best != NO_SQUARE:
+            return best
+        king = KING * by
+        for frm in KING_TARGETS[sq]:
+            if squares[frm] == king:
+                return frm
+        return NO_SQUARE
+
+    def has_non_pawn_material(self, side):
+        """ Whether `side` has a piece besides its king and pawns, without which zugzwang is common """
+        return any(KNIGHT <= code * side <= QUEEN for code in self.squares)
+
+    def in_check(self):
+        return self.attacked(self.king[self.side], -self.side)
+
+    def pseudo_moves(self, captures=True, quiets=True):
+        """ Moves that ignore checks. `captures` covers captures and promotions, `quiets` everything else """
+        squares = self.squares
+        side = self.side
+        moves = []
+        for frm in range(64):
+            if squares[frm] * side > 0:
+                self._piece_moves(frm, moves, captures, quiets)
+        return moves
+
+    def is_pseudo_legal(self, move):
+        """ Whether a move from elsewhere (hash table, killer slot) can be played here, ignoring checks """
+        frm = move & 63
+        if self.squares[frm] * self.side <= 0:
+            return False
+        moves = []
+        self._piece_moves(frm, moves, True, True)
+        return move in moves
+
+    def is_capture(self, move):
+        to = (move >> 6) & 63
+        return self.squares[to] != EMPTY or move >> FLAG_SHIFT == EN_PASSANT_FLAG
+
+    def check_info(self):
+        """ Checking pieces, the squares that stop a single check, and pinned pieces with the squares they may move to """
+        squares = self.squares
+        side = self.side
+        ksq = self.king[side]
+        checkers = []
+        evasions = set()
+        pinned = {}
+        for frm in PAWN_CAPTURES[side][ksq]:
+            if squares[frm] == -PAWN * side:
+                checkers.append(frm)
+                evasions.add(frm)
+        for frm in KNIGHT_TARGETS[ksq]:
+            if squares[frm] == -KNIGHT * side:
+                checkers.append(frm)
+                evasions.add(frm)
+        for rays, slider in ((DIAGONAL_RAYS[ksq], BISHOP), (ORTHOGONAL_RAYS[ksq], ROOK)):
+            for ray in rays:
+                blocker = NO_SQUARE
+                for i, sq in enumerate(ray):
+                    piece = squares[sq] * side
+                    if piece > 0:
+                        if blocker != NO_SQUARE:
+                            break
+                        blocker = sq
+                    elif piece < 0:
+                        if piece == -slider or piece == -QUEEN:
+                            if blocker == NO_SQUARE:
+                                checkers.append(sq)
+                                evasions.update(ray[:i + 1])
+                            else:
+                                pinned[blocker] = ray[:i + 1]
+                        break
+        return checkers, evasions, pinned
+
+    def is_legal(self, move, info):
+        """ Whether a pseudo legal move keeps the king safe, given check_info() for this position """
+        checkers, evasions, pinned = info
+        side = self.side
+        frm = move & 63
+        to = (move >> 6) & 63
+        if frm == self.king[side] or move >> FLAG_SHIFT == EN_PASSANT_FLAG:
+            # king moves and en passant captures are tried on the board
+            self.make(move)
+            legal = not self.attacked(self.king[side], -side)
+            self.unmake()
+            return legal
+        if len(checkers) > 1:
+            return False
+        if checkers and to not in evasions:
+            return False
+        return frm not in pinned or to in pinned[frm]
+
+    def legal_moves(self, captures=True, quiets=True):
+        info = self.check_info()
+        return [move for move in self.pseudo_moves(captures, quiets) if self.is_legal(move, info)]
+
+    def has_legal_move(self):
+        info = self.check_info()
+        for move in self.pseudo_moves():
+            if self.is_legal(move, info):
+                return True
+        return False
+
+    def find_move(self, frm, to, promotion=QUEEN):
+        """ Legal move from `frm` to `to`, preferring `promotion` when the move promotes """
+        found = None
+        for move in self.legal_moves():
+            if move & 63 == frm and (move >> 6) & 63 == to:
+                if (move >> 12) & 7 in (0, promotion):
+                    return move
+                found = move
+        return found
+
+    def parse_move(self, name):
+        """ Legal move for coordinate notation such as e2e4 or a7a8q, or None """
+        for move in self.legal_moves():
+            if move_name(move) == name:
+                return move
+        return None
+
+    def parse_san(self, san):
+        """ Legal move for standard algebraic notation such as Nf3, exd5, O-O or e8=Q+, or None """
+        san = san.rstrip("+#!?")
+        moves = self.legal_moves()
+        if san in ("O-O", "O-O-O", "0-0", "0-0-0"):
+            for move in moves:
+                if move >> FLAG_SHIFT == CASTLE_FLAG and ((move >> 6) & 63 < (move & 63)) == (len(san) == 5):
+                    return move
+            return None
+        promotion = 0
+        if "=" in san:
+            san, letter = san.split("=", 1)
+            promotion = FEN_PIECES.get(letter[:1].lower(), 0)
+        elif len(san) > 2 and san[-1] in "QRBN" and san[-2].isdigit():
+            san, promotion = san[:-1], FEN_PIECES[san[-1].lower()]
+        kind = FEN_PIECES[san[0].lower()] if san[:1] in ("N", "B", "R", "Q", "K") else PAWN
+        body = (san[1:] if kind != PAWN else san).replace("x", "").replace("-", "")
+        if len(body) < 2 or body[-2] not in "abcdefgh" or body[-1] not in "12345678":
+            return None
+        to = square(ROWS - int(body[-1]), ord(body[-2]) - ord("a"))
+        # optional origin file and/or rank that tell apart pieces of the same kind
+        hint = body[:-2]
+        for move in moves:
+            frm = move & 63
+            if (move >> 6) & 63 != to or self.squares[frm] * self.side != kind or (move >> 12) & 7 != promotion:
+                continue
+            if all(frm & 7 == ord(c) - ord("a") if c in "abcdefgh" else ROWS - (frm >> 3) == int(c) for c in hint):
+                return move
+        return None
+
+    def san(self, move):
+        """ Standard algebraic notation of a legal move, such as Nbd2, exd5, O-O or e8=Q+ """
+        frm = move & 63
+        to = (move >> 6) & 63
+        promotion = (move >> 12) & 7
+        kind = self.squares[frm] * self.side
+        target = "abcdefgh"[to & 7] + str(ROWS - (to >> 3))
+        if move >> FLAG_SHIFT == CASTLE_FLAG:
+            name = "O-O" if to > frm else "O-O-O"
+        elif kind == PAWN:
+            name = ("abcdefgh"[frm & 7] + "x" if self.is_capture(move) else "") + target
+            if promotion:
+                name += "=" + PROMOTION_LETTERS[promotion].upper()
+        else:
+            # origin file, else rank, else both when another piece of the same kind can also go there
+            rivals = [other & 63 for other in self.legal_moves() if (other >> 6) & 63 == to
+                      and other & 63 != frm and self.squares[other & 63] == self.squares[frm]]
+            hint = ""
+            if rivals:
+                if all(sq & 7 != frm & 7 for sq in rivals):
+                    hint = "abcdefgh"[frm & 7]
+                elif all(sq >> 3 != frm >> 3 for sq in rivals):
+                    hint = str(ROWS - (frm >> 3))
+                else:
+                    hint = "abcdefgh"[frm & 7] + str(ROWS - (frm >> 3))
+            name = "NBRQK"[kind - 2] + hint + ("x" if self.is_capture(move) else "") + target
+        self.make(move)
+        if self.in_check():
+            name += "+" if self.has_legal_move() else "#"
+        self.unmake()
+        return name
+
+    def _piece_moves(self, frm, moves, captures, quiets):
+        kind = self.squares[frm] * self.side
+        if kind == PAWN:
+            self._pawn_moves(frm, moves, captures, quiets)
+        elif kind == KNIGHT:
+            self._step_moves(frm, KNIGHT_TARGETS[frm], moves, captures, quiets)
+        elif kind == BISHOP:
+            self._slide_moves(frm, DIAGONAL_RAYS[frm], moves, captures, quiets)
+        elif kind == ROOK:
+            self._slide_moves(frm, ORTHOGONAL_RAYS[frm], moves, captures, quiets)
+        elif kind == QUEEN:
+            self._slide_moves(frm, ALL_RAYS[frm], moves, captures, quiets)
+        else:
+            self._step_moves(frm, KING_TARGETS[frm], moves, captures, quiets)
+            if quiets:
+                self._castling_moves(frm, moves)
+
+    def _pawn_moves(self, frm, moves, captures, quiets):
+        squares = self.squares
+        side = self.side
+        row = frm >> 3
+        to = frm - 8 * side
+        promotes = row - side == (0 if side == WHITE else 7)
+        start_row = 6 if side == WHITE else 1
+        if squares[to] == EMPTY:
+            if promotes:
+                if captures:
+                    self._promotions(frm, to, moves)
+            elif quiets:
+                moves.append(frm | (to << 6))
+                if row == start_row and squares[to - 8 * side] == EMPTY:
+                    moves.append(frm | ((to - 8 * side) << 6) | DOUBLE_PUSH)
+        if not captures:
+            return
+        for target in PAWN_CAPTURES[side][frm]:
+            if squares[target] * side < 0:
+                if promotes:
+                    self._promotions(frm, target, moves)
+                else:
+                    moves.append(frm | (target << 6))
+            elif target == self.ep:
+                moves.append(frm | (target << 6) | EN_PASSANT)
+
+    @staticmethod
+    def _promotions(frm, to, moves):
+        for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+            moves.append(frm | (to << 6) | (promotion << 12))
+
+    def _step_moves(self, frm, targets, moves, captures, quiets):
+        squares = self.squares
+        side = self.side
+        for to in targets:
+            target = squares[to] * side
+            if (target < 0 and captures) or (target == 0 and quiets):
+                moves.append(frm | (to << 6))
+
+    def _slide_moves(self, frm, rays, moves, captures, quiets):
+        squares = self.squares
+        side = self.side
+        for ray in rays:
+            for to in ray:
+                target = squares[to] * side
+                if target > 0:
+                    break
+                if target < 0:
+                    if captures:
+                        moves.append(frm | (to << 6))
+                    break
+                if quiets:
+                    moves.append(frm | (to << 6))
+
+    def _castling_moves(self, frm, moves):
+        squares = self.squares
+        side = self.side
+        kingside, queenside = (WHITE_KINGSIDE, WHITE_QUEENSIDE) if side == WHITE else (BLACK_KINGSIDE, BLACK_QUEENSIDE)
+        if not self.castling & (kingside | queenside) or self.attacked(frm, -side):
+            return
+        if self.castling & kingside and squares[frm + 1] == EMPTY and squares[frm + 2] == EMPTY:
+            if not self.attacked(frm + 1, -side):
+                moves.append(frm | ((frm + 2) << 6) | CASTLE)
+        if (self.castling & queenside and squares[frm - 1] == EMPTY and squares[frm - 2] == EMPTY
+                and squares[frm - 3] == EMPTY):
+            if not self.attacked(frm - 1, -side):
+                moves.append(frm | ((frm - 2) << 6) | CASTLE)
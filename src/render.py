@@ -0,0 +1,32 @@
+import pygame
+from const import *
+
+
+class RenderScheduler:
+    """ Collects the screen areas that changed since the last frame and repaints only those """
+
+    def __init__(self):
+        self.dirty = [pygame.Rect(0, 0, WIDTH, HEIGHT)]
+
+    def invalidate(self, rect=None):
+        """ Marks `rect` for repainting, or the whole window when no rect is given """
+        self.dirty.append(pygame.Rect(rect) if rect is not None else pygame.Rect(0, 0, WIDTH, HEIGHT))
+
+    def invalidate_square(self, row, col):
+        self.invalidate((col * SQUARE_SIZE, row * SQUARE_SIZE, SQUARE_SIZE, SQUARE_SIZE))
+
+    def flush(self, screen, draw):
+        """ Redraws the dirty areas with draw(screen) clipped to each of them, then pushes them to the display """
+        if not self.dirty:
+            return
+        screen_rect = screen.get_rect()
+        rects = [rect.clip(screen_rect) for rect in self.dirty]
+        # past half the window it is cheaper to repaint everything once
+        if sum(rect.width * rect.height for rect in rects) > WIDTH * HEIGHT // 2:
+            rects = [screen_rect]
+        for rect in rects:
+            screen.set_clip(rect)
+            draw(screen)
+        screen.set_clip(None)
+        pygame.display.update(rects)
+        self.dirty = []
@@ -1,6 +1,8 @@
 class Square:
     ALPHACOLS = {0: 'A', 1: 'B', 2: 'C', 3: 'D', 4: 'E', 5: 'F', 6: 'G', 7: 'H'}
 
+    __slots__ = ("row", "col", "piece", "alphacol")
+
     def __init__(self, row, col, piece=None):
         self.row = row
         self.col = col
@@ -0,0 +1,144 @@
+import contextlib
+import cProfile
+import json
+import time
+import tracemalloc
+from position import Position
+
+# Position methods timed by timed_sections, by the SearchStats field their time goes to. Only the outermost
+# timed call is measured, so legal_moves counts as move generation even though it also tests legality.
+TIMED_METHODS = {
+    "movegen_seconds": ("pseudo_moves", "is_pseudo_legal", "legal_moves", "has_legal_move"),
+    "check_seconds": ("check_info", "is_legal", "attacked", "in_check"),
+    "eval_seconds": ("evaluate",),
+}
+
+
+class SearchStats:
+    """ Counters of one ChessAI.search, with the rates derived from them """
+
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.depth = 0
+        self.seldepth = 0
+        # nodes whose moves were searched, and how many of those ended in a beta cutoff (on the first move)
+        self.interior = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # selective search: cutoffs by reverse futility and null moves, quiet moves pruned by futility,
+        # late moves reduced and the reductions that had to be searched again at full depth
+        self.reverse_futility_cutoffs = 0
+        self.null_cutoffs = 0
+        self.futility_pruned = 0
+        self.reductions = 0
+        self.re_searches = 0
+        # zero window searches that beat alpha and root searches that fell outside the aspiration window
+        self.pvs_re_searches = 0
+        self.aspiration_re_searches = 0
+        # nodes scored as draws by repetition or the fifty-move rule
+        self.draws = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.seconds = 0.0
+        # only measured with ChessAI.timing
+        self.movegen_seconds = 0.0
+        self.check_seconds = 0.0
+        self.eval_seconds = 0.0
+        # peak traced memory in bytes with ChessAI.trace_memory, the cProfile.Profile with ChessAI.profile
+        self.memory_peak = None
+        self.profile = None
+
+    @property
+    def nps(self):
+        return self.nodes / self.seconds if self.seconds else 0.0
+
+    @property
+    def cutoff_rate(self):
+        return self.cutoffs / self.interior if self.interior else 0.0
+
+    @property
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self):
+        """ Counters and rates as plain values, the profile left out """
+        fields = {name: value for name, value in vars(self).items() if name != "profile"}
+        fields.update(nps=self.nps, cutoff_rate=self.cutoff_rate, first_move_cutoff_rate=self.first_move_cutoff_rate,
+                      tt_hit_rate=self.tt_hit_rate)
+        return fields
+
+    def __repr__(self):
+        return (f"SearchStats(depth {self.depth}/{self.seldepth}, {self.nodes} nodes, {self.nps:.0f} nps, "
+                f"cutoffs {self.cutoff_rate:.1%} ({self.first_move_cutoff_rate:.1%} first move), "
+                f"tt hits {self.tt_hit_rate:.1%})")
+
+
+class SearchLog:
+    """ Appends one JSON object per search to a file, as JSON lines """
+
+    def __init__(self, path):
+        self.path = path
+
+    def write(self, stats, **fields):
+        record = {"time": time.time()}
+        record.update(stats.as_dict())
+        record.update(fields)
+        with open(self.path, "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+@contextlib.contextmanager
+def timed_sections(stats):
+    """
+    Adds the time spent in move generation, check detection and evaluation to `stats` while active. The
+    Position methods are swapped at class level, so this also times other threads and costs a lot of speed.
+    """
+    originals = {}
+    active = [False]
+
+    def timed(field, method):
+        def wrapper(*args, **kwargs):
+            if active[0]:
+                return method(*args, **kwargs)
+            active[0] = True
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                setattr(stats, field, getattr(stats, field) + time.perf_counter() - start)
+                active[0] = False
+        return wrapper
+
+    for field, names in TIMED_METHODS.items():
+        for name in names:
+            originals[name] = getattr(Position, name)
+            setattr(Position, name, timed(field, originals[name]))
+    try:
+        yield stats
+    finally:
+        for name, method in originals.items():
+            setattr(Position, name, method)
+
+
+@contextlib.contextmanager
+def instrument(stats, timing=False, profile=False, trace_memory=False):
+    """ Runs the body with the hooks that are switched on, leaving their results in `stats` """
+    with contextlib.ExitStack() as hooks:
+        if timing:
+            hooks.enter_context(timed_sections(stats))
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            hooks.callback(tracemalloc.stop)
+        if trace_memory:
+            tracemalloc.reset_peak()
+            hooks.callback(lambda: setattr(stats, "memory_peak", tracemalloc.get_traced_memory()[1]))
+        if profile:
+            stats.profile = cProfile.Profile()
+            stats.profile.enable()
+            hooks.callback(stats.profile.disable)
+        yield stats
@@ -0,0 +1,427 @@
+import itertools
+import mmap
+import multiprocessing
+import os
+import sys
+import time
+from array import array
+from position import Position, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK
+from attacks import KNIGHT_TARGETS, KING_TARGETS, DIAGONAL_RAYS, ORTHOGONAL_RAYS, ALL_RAYS, PAWN_CAPTURES
+
+# Tables hold one byte per position: 0 for draws (and impossible positions), otherwise 1 + the distance to mate
+# in plies. Odd distances are wins for the side to move, even ones losses, 0 being checkmated already.
+DRAW = 0
+MAX_PIECES = 4
+EXTENSION = ".tb"
+
+# A table indexes its pieces in signature order, white king first: side to move, white king square folded
+# onto files a-d (the board is mirrored left to right otherwise, which never changes a castling-free
+# position's value), then six bits per further piece.
+KING_FILES = 4
+PIECE_LETTERS = "KQRBNP"
+LETTER_KINDS = {"K": KING, "Q": QUEEN, "R": ROOK, "B": BISHOP, "N": KNIGHT, "P": PAWN}
+
+# Per position bookkeeping during generation, kept in the move count array
+INVALID = 255
+CANNOT_LOSE = 254
+
+
+def _between(rays):
+    # between[frm][to]: squares strictly between two squares on a common ray
+    between = [{} for sq in range(64)]
+    for frm in range(64):
+        for ray in rays[frm]:
+            for i, to in enumerate(ray):
+                between[frm][to] = ray[:i]
+    return between
+
+
+SLIDER_RAYS = {BISHOP: DIAGONAL_RAYS, ROOK: ORTHOGONAL_RAYS, QUEEN: ALL_RAYS}
+BETWEEN = {kind: _between(rays) for kind, rays in SLIDER_RAYS.items()}
+KNIGHT_SETS = [frozenset(targets) for targets in KNIGHT_TARGETS]
+KING_SETS = [frozenset(targets) for targets in KING_TARGETS]
+
+
+def signature_codes(signature):
+    """ Piece codes of a signature such as KRvKP, in table slot order """
+    white, black = signature.split("v")
+    return [LETTER_KINDS[letter] for letter in white] + [-LETTER_KINDS[letter] for letter in black]
+
+
+def _letters(kinds):
+    return "".join(sorted((PIECE_LETTERS[KING - kind] for kind in kinds), key=PIECE_LETTERS.index))
+
+
+def material_signature(codes):
+    """ Signature such as KRvKP for piece codes in any order """
+    codes = list(codes)
+    return _letters(code for code in codes if code > 0) + "v" + _letters(-code for code in codes if code < 0)
+
+
+def flipped(signature):
+    white, black = signature.split("v")
+    return black + "v" + white
+
+
+def canonical(signature):
+    """ The signature a table is stored under: the side with more, then more valuable, pieces is white """
+    def strength(letters):
+        return len(letters), [-PIECE_LETTERS.index(letter) for letter in letters]
+    white, black = signature.split("v")
+    return signature if strength(white) >= strength(black) else flipped(signature)
+
+
+def all_signatures(max_pieces=MAX_PIECES):
+    signatures = set()
+    for count in range(1, max_pieces - 1):
+        for kinds in itertools.combinations_with_replacement((QUEEN, ROOK, BISHOP, KNIGHT, PAWN), count):
+            for sides in itertools.product((WHITE, BLACK), repeat=count):
+                codes = [KING, -KING] + [kind * side for kind, side in zip(kinds, sides)]
+                signatures.add(canonical(material_signature(codes)))
+    return sorted(signatures, key=_generation_order)
+
+
+def _generation_order(signature):
+    # captures lead to fewer pieces and promotions to fewer pawns, so tables only depend on earlier groups
+    return len(signature) - 1, signature.count("P"), signature
+
+
+def _exits(signature):
+    """ Tables reached by a capture or a promotion """
+    codes = signature_codes(signature)
+    found = set()
+    for i, code in enumerate(codes):
+        if abs(code) == KING:
+            continue
+        rest = codes[:i] + codes[i + 1:]
+        if len(rest) > 2:
+            found.add(canonical(material_signature(rest)))
+        if abs(code) == PAWN:
+            for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                promoted = codes[:i] + [promotion if code > 0 else -promotion] + codes[i + 1:]
+                found.add(canonical(material_signature(promoted)))
+                for j, other in enumerate(promoted):
+                    if abs(other) != KING and (other > 0) != (code > 0):
+                        captured = promoted[:j] + promoted[j + 1:]
+                        if len(captured) > 2:
+                            found.add(canonical(material_signature(captured)))
+    return found
+
+
+def _index(sqs, side):
+    wk = sqs[0]
+    if wk & 7 >= KING_FILES:
+        sqs = [sq ^ 7 for sq in sqs]
+        wk = sqs[0]
+    index = (0 if side == WHITE else 1) << 5 | (wk >> 3) << 2 | (wk & 7)
+    for sq in sqs[1:]:
+        index = index << 6 | sq
+    return index
+
+
+def _decode(index, count):
+    sqs = [0] * count
+    for slot in range(count - 1, 0, -1):
+        sqs[slot] = index & 63
+        index >>= 6
+    sqs[0] = ((index >> 2) & 7) << 3 | (index & 3)
+    return sqs, WHITE if index < 32 else BLACK
+
+
+def _attacks(code, frm, to, sqs):
+    kind = abs(code)
+    if kind == PAWN:
+        return to in PAWN_CAPTURES[1 if code > 0 else -1][frm]
+    if kind == KNIGHT:
+        return to in KNIGHT_SETS[frm]
+    if kind == KING:
+        return to in KING_SETS[frm]
+    between = BETWEEN[kind][frm].get(to)
+    return between is not None and not any(sq in between for sq in sqs)
+
+
+def _in_check(codes, sqs, side, skip=-1):
+    """ Whether the king of `side` is attacked, ignoring the piece in slot `skip` (just captured) """
+    king = sqs[codes.index(KING * side)]
+    for slot, code in enumerate(codes):
+        if slot != skip and (code > 0) != (side > 0) and _attacks(code, sqs[slot], king, sqs):
+            return True
+    return False
+
+
+def _moves(codes, sqs, side):
+    """ Pseudo legal (slot, to, captured slot) moves of `side` without en passant; captured slot -1 when quiet """
+    for slot, code in enumerate(codes):
+        if (code > 0) != (side > 0):
+            continue
+        frm = sqs[slot]
+        kind = code * side
+        if kind == PAWN:
+            to = frm - 8 * side
+            if to not in sqs:
+                yield slot, to, -1
+                if frm >> 3 == (6 if side == WHITE else 1) and to - 8 * side not in sqs:
+                    yield slot, to - 8 * side, -1
+            targets = PAWN_CAPTURES[side][frm]
+        elif kind == KNIGHT or kind == KING:
+            targets = (KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS)[frm]
+        else:
+            for ray in SLIDER_RAYS[kind][frm]:
+                for to in ray:
+                    if to in sqs:
+                        other = sqs.index(to)
+                        if (codes[other] > 0) != (side > 0):
+                            yield slot, to, other
+                        break
+                    yield slot, to, -1
+            continue
+        for to in targets:
+            if to in sqs:
+                other = sqs.index(to)
+                if (codes[other] > 0) != (side > 0):
+                    yield slot, to, other
+            elif kind != PAWN:
+                yield slot, to, -1
+
+
+def _unmoves(codes, sqs, side):
+    """ (slot, from) quiet moves of the side that is not to move which could have led to this position """
+    mover = -side
+    for slot, code in enumerate(codes):
+        if (code > 0) != (mover > 0):
+            continue
+        to = sqs[slot]
+        kind = code * mover
+        if kind == PAWN:
+            frm = to + 8 * mover
+            if 1 <= frm >> 3 <= 6 and frm not in sqs:
+                yield slot, frm
+                if to >> 3 == (4 if mover == WHITE else 3) and frm + 8 * mover not in sqs:
+                    yield slot, frm + 8 * mover
+        elif kind == KNIGHT or kind == KING:
+            for frm in (KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS)[to]:
+                if frm not in sqs:
+                    yield slot, frm
+        else:
+            for ray in SLIDER_RAYS[kind][to]:
+                for frm in ray:
+                    if frm in sqs:
+                        break
+                    yield slot, frm
+
+
+class Tablebases:
+    """
+    The tables of a directory, memory mapped so that loading costs nothing and only the probed pages are read.
+    Positions whose material has no table, and positions with castling rights or an en passant square (which
+    the tables leave out), are not probed.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.tables = {}
+        # bare kings are always a draw
+        self.max_pieces = 2
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.endswith(EXTENSION):
+                    with open(os.path.join(directory, name), "rb") as file:
+                        self.tables[name[:-len(EXTENSION)]] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                    self.max_pieces = max(self.max_pieces, len(name) - len(EXTENSION) - 1)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        self.tables = {}
+        self.max_pieces = 2
+
+    def lookup(self, pieces, side):
+        """ Stored byte for [(code, square)] pieces with `side` to move, None without a table for the material """
+        if len(pieces) == 2:
+            return DRAW
+        signature = material_signature(code for code, sq in pieces)
+        table = self.tables.get(signature)
+        if table is None:
+            table = self.tables.get(flipped(signature))
+            if table is None:
+                return None
+            # the same position with the colours swapped and the board turned upside down
+            pieces = [(-code, sq ^ 56) for code, sq in pieces]
+            side = -side
+        pieces.sort(key=lambda piece: (piece[0] < 0, -abs(piece[0])))
+        return table[_index([sq for code, sq in pieces], side)]
+
+    def probe(self, position):
+        """ (result, plies to mate) for the side to move, result being 1, 0 or -1; None when unknown """
+        # tables leave out en passant captures, so only positions where one is possible are turned down
+        if position.piece_count > self.max_pieces or position.castling or position.ep_key():
+            return None
+        value = self.lookup([(code, sq) for sq, code in enumerate(position.squares) if code], position.side)
+        if value is None:
+            return None
+        if value == DRAW:
+            return 0, 0
+        return (1 if (value - 1) & 1 else -1), value - 1
+
+
+def generate(signature, directory):
+    """ Builds the table of one signature by retrograde analysis; the tables it exits into must exist """
+    codes = signature_codes(signature)
+    count = len(codes)
+    size = 2 * KING_FILES * 8 << 6 * (count - 1)
+    tables = Tablebases(directory)
+    result = bytearray(size)
+    moves = bytearray(size)
+    # no loss can come sooner than the captures and promotions that reach a win for the opponent
+    loss_level = bytearray(size)
+    # positions that resolve when generation reaches their level, as long as nothing resolved them before
+    pending = [array("L") for level in range(256)]
+
+    # forward pass: validity, mates, moves within the table and the results of moves leaving it
+    pawns = [slot for slot, code in enumerate(codes) if abs(code) == PAWN]
+    index = 0
+    for side in (WHITE, BLACK):
+        for king in range(KING_FILES * 8):
+            for rest in itertools.product(range(64), repeat=count - 1):
+                sqs = [(king >> 2) << 3 | (king & 3)]
+                sqs.extend(rest)
+                if (len(set(sqs)) < count or _in_check(codes, sqs, -side)
+                        or any(sqs[slot] >> 3 in (0, 7) for slot in pawns)):
+                    moves[index] = INVALID
+                    index += 1
+                    continue
+                legal = quiet = 0
+                win = lose = 0
+                drawn = False
+                for slot, to, captured in _moves(codes, sqs, side):
+                    child = sqs[:]
+                    child[slot] = to
+                    if _in_check(codes, child, side, captured):
+                        continue
+                    promotes = codes[slot] * side == PAWN and to >> 3 in (0, 7)
+                    if captured < 0 and not promotes:
+                        legal += 1
+                        quiet += 1
+                        continue
+                    for promotion in ((QUEEN, ROOK, BISHOP, KNIGHT) if promotes else (0,)):
+                        legal += 1
+                        pieces = [(promotion * side if k == slot and promotion else codes[k], child[k])
+                                  for k in range(count) if k != captured]
+                        value = tables.lookup(pieces, -side)
+                        if value is None:
+                            missing = canonical(material_signature(code for code, sq in pieces))
+                            raise ValueError(f"{signature} needs the {missing} table")
+                        # the position after the move is `value - 1` plies from mate, this one a ply further
+                        if value == DRAW:
+                            drawn = True
+                        elif (value - 1) & 1:
+                            lose = max(lose, value)
+                        elif not win or value < win:
+                            win = value
+                if not legal:
+                    if _in_check(codes, sqs, side):
+                        pending[0].append(index)
+                    moves[index] = CANNOT_LOSE
+                elif win:
+                    pending[win].append(index)
+                    moves[index] = CANNOT_LOSE
+                elif drawn:
+                    moves[index] = CANNOT_LOSE
+                else:
+                    moves[index] = quiet
+                    loss_level[index] = lose
+                    if not quiet:
+                        pending[lose].append(index)
+                index += 1
+
+    # backward pass, one distance to mate at a time: predecessors of losses are wins one ply further, and a
+    # position whose every move reaches a win for the opponent is lost
+    resolved = array("L")
+    for level in range(254):
+        current = resolved
+        resolved = array("L")
+        for node in pending[level]:
+            if not result[node]:
+                result[node] = level + 1
+                current.append(node)
+        if not current:
+            if any(pending[level + 1:]):
+                continue
+            break
+        for node in current:
+            sqs, side = _decode(node, count)
+            for slot, frm in _unmoves(codes, sqs, side):
+                previous = sqs[:]
+                previous[slot] = frm
+                predecessor = _index(previous, -side)
+                remaining = moves[predecessor]
+                if remaining == INVALID or result[predecessor]:
+                    continue
+                if not level & 1:
+                    result[predecessor] = level + 2
+                    resolved.append(predecessor)
+                elif remaining != CANNOT_LOSE:
+                    moves[predecessor] = remaining - 1
+                    if remaining == 1:
+                        lost_at = max(level + 1, loss_level[predecessor])
+                        if lost_at == level + 1:
+                            result[predecessor] = level + 2
+                            resolved.append(predecessor)
+                        else:
+                            pending[lost_at].append(predecessor)
+    tables.close()
+
+    path = os.path.join(directory, signature + EXTENSION)
+    with open(path + ".tmp", "wb") as file:
+        file.write(result)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def _generate_task(args):
+    signature, directory = args
+    start = time.time()
+    generate(signature, directory)
+    return signature, time.time() - start
+
+
+def generate_all(directory, signatures=None, processes=None):
+    """
+    Generates the tables for `signatures` (every signature of up to MAX_PIECES pieces by default) and the
+    tables they depend on, skipping those already in `directory`. Tables of the same piece and pawn count never
+    depend on each other, so each such group is generated in parallel, one process per signature.
+    """
+    os.makedirs(directory, exist_ok=True)
+    wanted = set()
+    todo = [canonical(signature) for signature in (signatures or all_signatures())]
+    while todo:
+        signature = todo.pop()
+        if signature not in wanted:
+            wanted.add(signature)
+            todo.extend(_exits(signature))
+    missing = [signature for signature in sorted(wanted, key=_generation_order)
+               if not os.path.exists(os.path.join(directory, signature + EXTENSION))]
+    groups = {}
+    for signature in missing:
+        groups.setdefault(_generation_order(signature)[:2], []).append(signature)
+    with multiprocessing.get_context("spawn").Pool(processes) as pool:
+        for key in sorted(groups):
+            tasks = [(signature, directory) for signature in groups[key]]
+            for signature, seconds in pool.imap_unordered(_generate_task, tasks):
+                print(f"{signature:<8} {seconds:>8.1f}s")
+
+
+if __name__ == '__main__':
+    # python tablebase.py generate <directory> [signature ...] | python tablebase.py probe <directory> <fen>
+    args = sys.argv[1:]
+    if len(args) >= 2 and args[0] == "generate":
+        generate_all(args[1], args[2:] or None)
+    elif len(args) >= 3 and args[0] == "probe":
+        result = Tablebases(args[1]).probe(Position(" ".join(args[2:])))
+        if result is None:
+            print("not in the tables")
+        else:
+            print(("draw", "win", "loss")[result[0]] + (f", mate in {result[1]} plies" if result[0] else ""))
+    else:
+        sys.exit("usage: python tablebase.py generate <directory> [signature ...] | "
+                 "python tablebase.py probe <directory> <fen>")
@@ -0,0 +1,21 @@
+import pygame
+
+PIECE_NAMES = ("pawn", "knight", "bishop", "rook", "queen", "king")
+PIECE_COLORS = ("white", "black")
+# 80px pieces sit on the board, 128px is the enlarged piece under the mouse while dragging
+TEXTURE_SIZES = (80, 128)
+
+
+class Textures:
+    """ Every piece image decoded once and converted to the display format, keyed by (color, name, size) """
+
+    def __init__(self):
+        self.surfaces = {}
+        for color in PIECE_COLORS:
+            for name in PIECE_NAMES:
+                for size in TEXTURE_SIZES:
+                    path = f"../assets/pieces/{size}px/{color}_{name}.png"
+                    self.surfaces[(color, name, size)] = pygame.image.load(path).convert_alpha()
+
+    def get(self, piece, size=80):
+        return self.surfaces[(piece.color, piece.name, size)]
@@ -0,0 +1,96 @@
+from array import array
+
+EXACT, LOWER, UPPER = 1, 2, 3
+
+# Each entry is a 64 bit key and a 64 bit packed data word
+ENTRY_SIZE = 16
+BUCKET_SIZE = 2
+_SCORE_BIAS = 1 << 31
+# Data word layout from the low bits: score 32, move 17, depth 8, bound 2, generation 5
+_MOVE_BITS = 17
+_DEPTH_SHIFT = 32 + _MOVE_BITS
+_BOUND_SHIFT = _DEPTH_SHIFT + 8
+_GENERATION_SHIFT = _BOUND_SHIFT + 2
+GENERATIONS = 32
+
+
+class TranspositionTable:
+    """
+    Fixed size hash table of search results. Every bucket holds a depth-preferred slot, kept unless a deeper
+    or equal search of any position comes along or it was stored by an earlier search, and an always-replace
+    slot that takes everything else.
+    """
+
+    def __init__(self, size_mb=16):
+        self.size_mb = size_mb
+        self.buckets = max(1, size_mb * 1024 * 1024 // (ENTRY_SIZE * BUCKET_SIZE))
+        self.keys = array("Q", bytes(8 * BUCKET_SIZE * self.buckets))
+        self.data = array("Q", bytes(8 * BUCKET_SIZE * self.buckets))
+        # counts searches, modulo GENERATIONS, so entries left by earlier ones can be told apart
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def clear(self):
+        self.keys = array("Q", bytes(8 * BUCKET_SIZE * self.buckets))
+        self.data = array("Q", bytes(8 * BUCKET_SIZE * self.buckets))
+        self.reset_stats()
+
+    def new_search(self):
+        """ Starts a generation: from now on entries stored before give way in the depth-preferred slots """
+        self.generation = (self.generation + 1) % GENERATIONS
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+
+    def probe(self, key):
+        """ Returns (depth, bound, score, move) stored for `key`, or None """
+        index = (key % self.buckets) * BUCKET_SIZE
+        keys = self.keys
+        for slot in (index, index + 1):
+            if keys[slot] == key:
+                self.hits += 1
+                return self._unpack(self.data[slot])
+        self.misses += 1
+        return None
+
+    def store(self, key, depth, bound, score, move):
+        index = (key % self.buckets) * BUCKET_SIZE
+        keys = self.keys
+        data = self.data
+        word = ((score + _SCORE_BIAS) | ((move or 0) << 32) | (depth << _DEPTH_SHIFT) | (bound << _BOUND_SHIFT)
+                | (self.generation << _GENERATION_SHIFT))
+        old = data[index]
+        if (keys[index] == key or old == 0 or old >> _GENERATION_SHIFT != self.generation
+                or depth >= (old >> _DEPTH_SHIFT) & 255):
+            slot = index
+        else:
+            slot = index + 1
+        if data[slot] and keys[slot] != key:
+            self.collisions += 1
+        keys[slot] = key
+        data[slot] = word
+
+    def hashfull(self):
+        """ Permille of the first thousand slots in use """
+        sample = min(1000, len(self.data))
+        return sum(1 for slot in range(sample) if self.data[slot]) * 1000 // sample
+
+    def stats(self):
+        probes = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "collisions": self.collisions,
+            "hit_rate": self.hits / probes if probes else 0.0,
+            "hashfull": self.hashfull(),
+        }
+
+    @staticmethod
+    def _unpack(word):
+        move = (word >> 32) & ((1 << _MOVE_BITS) - 1)
+        return ((word >> _DEPTH_SHIFT) & 255, (word >> _BOUND_SHIFT) & 3, (word & 0xFFFFFFFF) - _SCORE_BIAS,
+                move or None)
@@ -0,0 +1,214 @@
+import multiprocessing
+import sys
+import threading
+from ai import ChessAI, MATE, TB_WIN, DECISIVE_SCORE
+from parallel import ParallelChessAI
+from book import OpeningBook
+from tablebase import Tablebases
+from position import Position, START_FEN, move_name
+
+ENGINE_NAME = "ChessAI"
+ENGINE_AUTHOR = "TanveenBal"
+
+# go arguments that take an integer value, as passed on to ChessAI.search
+GO_LIMITS = ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth", "nodes")
+
+
+class UCIEngine:
+    """ Universal Chess Interface front end: reads commands from `input`, writes replies to `output` """
+
+    def __init__(self, input=sys.stdin, output=sys.stdout):
+        self.input = input
+        self.output = output
+        self.ai = ChessAI("white")
+        self.ai.on_iteration = self._info
+        # search processes, more than one searching with a ParallelChessAI
+        self.threads = 1
+        self.position = Position()
+        self.thread = None
+        self.infinite = False
+        self.pondering = False
+        # set once bestmove may be sent by an infinite or ponder search: on stop, or on ponderhit
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+
+    def send(self, line):
+        with self.lock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def run(self):
+        for line in self.input:
+            if not self.handle(line.split()):
+                break
+
+    def handle(self, tokens):
+        """ Runs one command, returns False once the engine should exit """
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {self.ai.tt.size_mb} min 1 max 4096")
+            self.send(f"option name Threads type spin default 1 min 1 max {multiprocessing.cpu_count()}")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name TablebasePath type string default <empty>")
+            self.send("option name Ponder type check default false")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "setoption":
+            self.set_option(args)
+        elif command == "ucinewgame":
+            self.stop()
+            self.ai.tt.clear()
+            self.position = Position()
+        elif command == "position":
+            self.stop()
+            self.set_position(args)
+        elif command == "go":
+            self.stop()
+            self.go(args)
+        elif command == "stop":
+            self.stop()
+        elif command == "ponderhit":
+            self.ponderhit()
+        elif command == "quit":
+            self.stop()
+            self._close_ai()
+            return False
+        return True
+
+    def set_option(self, args):
+        if "name" not in args or "value" not in args:
+            return
+        name = " ".join(args[args.index("name") + 1:args.index("value")]).lower()
+        value = " ".join(args[args.index("value") + 1:])
+        if name == "hash":
+            self._new_ai(int(value), self.threads)
+        elif name == "threads":
+            self._new_ai(self.ai.tt.size_mb, int(value))
+        elif name == "bookfile":
+            self.stop()
+            if self.ai.book is not None:
+                self.ai.book.close()
+                self.ai.book = None
+            if value and value != "<empty>":
+                try:
+                    self.ai.book = OpeningBook(value)
+                except OSError as error:
+                    self.send(f"info string cannot open book {value}: {error.strerror}")
+        elif name == "tablebasepath":
+            self.stop()
+            if self.ai.tablebases is not None:
+                self.ai.tablebases.close()
+            self.ai.tablebases = Tablebases(value) if value and value != "<empty>" else None
+
+    def _new_ai(self, tt_size_mb, threads):
+        """ Replaces the ChessAI, a ParallelChessAI with more than one thread, keeping its book and tablebases """
+        self.stop()
+        book, tablebases = self.ai.book, self.ai.tablebases
+        self._close_ai()
+        self.threads = max(1, threads)
+        if self.threads > 1:
+            self.ai = ParallelChessAI("white", tt_size_mb, self.threads)
+        else:
+            self.ai = ChessAI("white", tt_size_mb)
+        self.ai.on_iteration = self._info
+        self.ai.book, self.ai.tablebases = book, tablebases
+
+    def _close_ai(self):
+        if isinstance(self.ai, ParallelChessAI):
+            self.ai.close()
+
+    def set_position(self, args):
+        if "moves" in args:
+            setup, moves = args[:args.index("moves")], args[args.index("moves") + 1:]
+        else:
+            setup, moves = args, []
+        if setup and setup[0] == "fen":
+            try:
+                position = Position(" ".join(setup[1:]))
+            except (KeyError, ValueError, IndexError) as error:
+                # a malformed FEN leaves the previous position in place
+                self.send(f"info string invalid fen {' '.join(setup[1:])}: {type(error).__name__} {error}")
+                return
+        else:
+            position = Position(START_FEN)
+        self.position = position
+        for name in moves:
+            move = self.position.parse_move(name)
+            if move is None:
+                break
+            self.position.make(move)
+
+    def go(self, args):
+        limits = {}
+        for i, arg in enumerate(args):
+            if arg in GO_LIMITS:
+                try:
+                    limits[arg] = int(args[i + 1])
+                except (IndexError, ValueError):
+                    # the search still runs, so that the GUI gets its bestmove, without the limit
+                    self.send(f"info string ignoring {arg}: {' '.join(args[i + 1:i + 2]) or 'no value'}")
+        self.infinite = "infinite" in args
+        if self.infinite:
+            limits["infinite"] = True
+        # the position already has the expected reply on it, the limits apply after ponderhit
+        self.pondering = "ponder" in args
+        if self.pondering:
+            limits["ponder"] = True
+        self.release.clear()
+        self.ai.clear_stop()
+        # search a copy so a new position command cannot change the board under the search
+        self.thread = threading.Thread(target=self._search, args=(self.position.copy(), limits), daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.release.set()
+            self.ai.stop()
+            self.thread.join()
+            self.thread = None
+
+    def ponderhit(self):
+        """ The opponent played the move pondered on: the search goes on with the limits of its go command """
+        if self.thread is not None and self.pondering:
+            self.pondering = False
+            self.ai.ponderhit()
+            if not self.infinite:
+                self.release.set()
+
+    def _search(self, position, limits):
+        move = None if self.infinite else self.ai.book_move(position)
+        if move is None:
+            move = self.ai.search(position, **limits)
+        # an infinite search, or a ponder search before ponderhit, may only send its best move after stop
+        if self.infinite or self.pondering:
+            self.release.wait()
+        if move is None:
+            self.send("bestmove 0000")
+            return
+        pv = self.ai.pv if self.ai.pv[:1] == [move] else [move]
+        self.send(f"bestmove {move_name(move)}" + (f" ponder {move_name(pv[1])}" if len(pv) > 1 else ""))
+
+    def _info(self, depth, score, move, nodes, seconds):
+        side = 1 if self.position.side > 0 else -1
+        pv = self.ai.pv
+        self.send(f"info depth {depth} seldepth {max(depth, self.ai.stats.seldepth)} score {uci_score(score * side)} "
+                  f"nodes {nodes} nps {int(nodes / max(seconds, 1e-3))} hashfull {self.ai.tt.hashfull()} "
+                  f"time {int(seconds * 1000)} pv {' '.join(map(move_name, pv))}")
+
+
+def uci_score(score):
+    """ UCI score of a search score for the side to move: "cp" centipawns, or "mate" in moves, negative when mated """
+    if abs(score) < DECISIVE_SCORE:
+        return f"cp {score}"
+    # plies to mate, from a checkmate or from a tablebase win
+    plies = MATE - abs(score) if abs(score) > TB_WIN else TB_WIN - abs(score)
+    return f"mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}"
+
+
+if __name__ == '__main__':
+    UCIEngine().run()
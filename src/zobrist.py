@@ -0,0 +1,16 @@
+import random
+
+_random = random.Random(0x5EED)
+
+
+def _key():
+    return _random.getrandbits(64)
+
+
+# PIECE_KEYS[code][sq] for signed piece codes: black codes -6..-1 wrap to the end of the list, code 0 is all zeros
+PIECE_KEYS = [[0] * 64] + [[_key() for sq in range(64)] for code in range(12)]
+SIDE_KEY = _key()
+CASTLING_KEYS = [0] + [_key() for rights in range(1, 16)]
+_FILE_KEYS = [_key() for col in range(8)]
+# EP_KEYS[sq] keys the en passant file; the extra last entry makes EP_KEYS[NO_SQUARE] zero
+EP_KEYS = [_FILE_KEYS[sq & 7] for sq in range(64)] + [0]